@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为 file_metadata 表创建 (session_id, is_processed) 复合覆盖索引
+"""
+
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.db.session import get_engine
+from scripts.index_utils import create_index_concurrently
+
+
+def create_file_metadata_session_status_index():
+    """
+    创建 (session_id, is_processed) INCLUDE (chunk_count) 覆盖索引（PostgreSQL 11+）
+
+    统计会话的处理进度时可以走 Index Only Scan；新索引以 session_id 开头，
+    原有的 session_id 单列索引变得多余，确认新索引有效后将其删除。
+    """
+    print("🚀 开始数据库迁移：创建文件元数据复合索引")
+
+    # CREATE/DROP INDEX CONCURRENTLY 不能在事务块内执行
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        create_index_concurrently(conn, "ix_filemeta_session_status", """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_filemeta_session_status
+            ON file_metadata (session_id, is_processed)
+            INCLUDE (chunk_count)
+        """)
+        print("✅ 复合索引已就绪")
+
+        conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_file_metadata_session_id"))
+        print("🗑️ 已删除多余的 session_id 单列索引")
+
+        # 更新统计信息和可见性映射，使 Index Only Scan 可以跳过回表检查
+        conn.execute(text("VACUUM ANALYZE file_metadata"))
+
+    print("🎉 数据库迁移完成！")
+
+
+if __name__ == "__main__":
+    try:
+        create_file_metadata_session_status_index()
+    except Exception as e:
+        print(f"💥 迁移脚本执行失败: {e}")
+        sys.exit(1)
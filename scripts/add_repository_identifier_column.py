@@ -10,15 +10,40 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy import text
-from src.db.session import engine
+from src.db.session import get_engine
 from src.utils.git_helper import GitHelper
+from scripts.index_utils import create_index_concurrently
+
+
+def create_missing_identifier_index():
+    """
+    创建覆盖待回填记录的部分索引
+
+    使查询未回填记录时只扫描尚未迁移的行，而不是全表扫描。
+    索引在迁移后保留：回填完成后它不包含任何行，几乎没有维护成本，
+    重复执行迁移时依然可以直接命中。
+    """
+    print("🔍 创建待回填记录的部分索引...")
+    
+    create_index_query = """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_analysis_sessions_missing_ri 
+        ON analysis_sessions (id) 
+        WHERE repository_identifier IS NULL 
+        AND repository_url IS NOT NULL
+    """
+    
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # 上次中断遗留的 INVALID 索引会被 IF NOT EXISTS 跳过，需要检查并重建
+        create_index_concurrently(conn, "ix_analysis_sessions_missing_ri", create_index_query)
+    
+    print("✅ 部分索引已就绪")
 
 
 def add_repository_identifier_column():
     """添加 repository_identifier 列到 analysis_sessions 表"""
     print("🚀 开始数据库迁移：添加 repository_identifier 列")
     
-    with engine.connect() as conn:
+    with get_engine().connect() as conn:
         # 开始事务
         trans = conn.begin()
         
@@ -58,6 +83,11 @@ def add_repository_identifier_column():
                 
                 print("✅ repository_identifier 列添加成功")
             
+            # 先提交列变更：CREATE INDEX CONCURRENTLY 不能在事务块内执行
+            trans.commit()
+            create_missing_identifier_index()
+            trans = conn.begin()
+            
             # 更新现有记录的 repository_identifier 值
             print("🔄 更新现有记录的 repository_identifier 值...")
             
@@ -74,28 +104,36 @@ def add_repository_identifier_column():
             if records:
                 print(f"📋 找到 {len(records)} 条需要更新的记录")
                 
-                for record in records:
+                # 同一仓库往往有多条分析记录，每个不同的 URL 只生成一次标识符
+                identifiers = {}
+                for repository_url in {record.repository_url for record in records}:
                     try:
-                        # 为每个记录生成 repository_identifier
-                        repo_identifier = GitHelper.generate_repository_identifier(record.repository_url)
-                        
-                        # 更新记录
-                        update_query = text("""
-                            UPDATE analysis_sessions 
-                            SET repository_identifier = :repo_identifier 
-                            WHERE id = :record_id
-                        """)
-                        
-                        conn.execute(update_query, {
-                            'repo_identifier': repo_identifier,
-                            'record_id': record.id
-                        })
-                        
-                        print(f"  📝 更新记录 ID {record.id}: {repo_identifier}")
-                        
+                        identifiers[repository_url] = GitHelper.generate_repository_identifier(repository_url)
                     except Exception as e:
-                        print(f"  ⚠️ 无法为记录 ID {record.id} 生成标识符: {e}")
+                        print(f"  ⚠️ 无法为仓库 {repository_url} 生成标识符: {e}")
+                
+                updates = []
+                failed = 0
+                for record in records:
+                    repo_identifier = identifiers.get(record.repository_url)
+                    if repo_identifier is None:
+                        failed += 1
+                        continue
+                    updates.append({
+                        'repo_identifier': repo_identifier,
+                        'record_id': record.id
+                    })
+                
+                if updates:
+                    update_query = text("""
+                        UPDATE analysis_sessions 
+                        SET repository_identifier = :repo_identifier 
+                        WHERE id = :record_id
+                    """)
+                    # 传入参数列表，由驱动以 executemany 方式批量执行
+                    conn.execute(update_query, updates)
                 
+                print(f"  📝 已更新 {len(updates)} 条记录，失败 {failed} 条")
                 print("✅ 现有记录更新完成")
             else:
                 print("ℹ️ 没有需要更新的记录")
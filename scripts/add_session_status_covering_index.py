@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为 analysis_sessions 表创建按 session_id 查询状态的覆盖索引
+"""
+
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.db.session import get_engine
+from scripts.index_utils import create_index_concurrently
+
+
+def create_session_status_covering_index():
+    """
+    创建 session_id 上的覆盖索引（PostgreSQL 11+）
+
+    状态查询都是 WHERE session_id = :sid，索引通过 INCLUDE 携带状态响应用到的列，
+    查询可以只读索引完成（Index Only Scan）而不必回表。
+    error_message 是 TEXT 列，长度不受限，放进索引可能超出索引行大小上限，因此不包含在内。
+    新索引同样是 session_id 上的唯一索引，确认其有效后删除原有的 session_id 单列唯一索引。
+    """
+    print("🚀 开始数据库迁移：创建会话状态覆盖索引")
+
+    create_index_query = """
+        CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_analysis_sessions_session_id_covering
+        ON analysis_sessions (session_id)
+        INCLUDE (
+            status, task_id, repository_url, repository_name, repository_owner,
+            total_files, processed_files, total_chunks, indexed_chunks,
+            created_at, started_at, completed_at
+        )
+    """
+
+    # CREATE/DROP INDEX CONCURRENTLY 不能在事务块内执行
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        create_index_concurrently(conn, "ix_analysis_sessions_session_id_covering", create_index_query)
+        print("✅ 覆盖索引已就绪")
+
+        conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_analysis_sessions_session_id"))
+        print("🗑️ 已删除多余的 session_id 单列唯一索引")
+
+        # 更新统计信息和可见性映射，使 Index Only Scan 可以跳过回表检查
+        conn.execute(text("VACUUM ANALYZE analysis_sessions"))
+
+        # 输出一条示例查询的执行计划，便于确认命中索引
+        sample = conn.execute(text("SELECT session_id FROM analysis_sessions LIMIT 1")).fetchone()
+        if sample:
+            plan = conn.execute(
+                text("""
+                    EXPLAIN (ANALYZE, BUFFERS)
+                    SELECT session_id, status, task_id, total_files, processed_files
+                    FROM analysis_sessions
+                    WHERE session_id = :session_id
+                """),
+                {"session_id": sample.session_id}
+            ).fetchall()
+            print("📋 示例查询执行计划:")
+            for row in plan:
+                print(f"  {row[0]}")
+
+    print("🎉 数据库迁移完成！")
+
+
+if __name__ == "__main__":
+    try:
+        create_session_status_covering_index()
+    except Exception as e:
+        print(f"💥 迁移脚本执行失败: {e}")
+        sys.exit(1)
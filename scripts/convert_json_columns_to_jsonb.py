@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：将 JSON 列转换为 JSONB 并创建相关索引（PostgreSQL）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.db.session import get_engine
+
+
+# 需要转换的 (表名, 列名)
+JSON_COLUMNS = [
+    ("analysis_sessions", "embedding_config"),
+    ("repositories", "embedding_config"),
+    ("query_logs", "vector_search_results"),
+    ("query_logs", "bm25_search_results"),
+    ("query_logs", "final_context"),
+    ("query_logs", "llm_config"),
+    ("file_metadata", "key_symbols"),
+    ("file_metadata", "dependencies"),
+]
+
+# 需要创建的 GIN 索引 (索引名, 表名, 列名)
+GIN_INDEXES = [
+    ("ix_analysis_sessions_embedding_config_gin", "analysis_sessions", "embedding_config"),
+    ("ix_querylog_llm_config_gin", "query_logs", "llm_config"),
+]
+
+# 需要创建的 B-tree 表达式索引 (索引名, 表名, 列名, 键名)，用于 ->> 取值的过滤和分组
+EXPRESSION_INDEXES = [
+    ("ix_session_emb_provider", "analysis_sessions", "embedding_config", "provider"),
+    ("ix_querylog_llm_model_name", "query_logs", "llm_config", "model_name"),
+    ("ix_querylog_llm_provider", "query_logs", "llm_config", "provider"),
+]
+
+
+def convert_json_columns_to_jsonb():
+    """将仍为 json 类型的列转换为 jsonb，已转换的列跳过"""
+    print("🚀 开始数据库迁移：JSON 列转换为 JSONB")
+
+    check_type_query = text("""
+        SELECT data_type
+        FROM information_schema.columns
+        WHERE table_name = :table_name
+        AND column_name = :column_name
+    """)
+
+    with get_engine().begin() as conn:
+        for table_name, column_name in JSON_COLUMNS:
+            row = conn.execute(
+                check_type_query,
+                {"table_name": table_name, "column_name": column_name}
+            ).fetchone()
+
+            if row is None:
+                print(f"  ⚠️ 列不存在，跳过: {table_name}.{column_name}")
+                continue
+            if row.data_type == "jsonb":
+                print(f"  ✅ 已是 JSONB，跳过: {table_name}.{column_name}")
+                continue
+
+            print(f"  🔄 转换 {table_name}.{column_name}...")
+            conn.execute(text(
+                f"ALTER TABLE {table_name} "
+                f"ALTER COLUMN {column_name} TYPE JSONB USING {column_name}::jsonb"
+            ))
+
+    print("✅ 列类型转换完成")
+
+
+def create_jsonb_indexes():
+    """创建 jsonb_path_ops GIN 索引（加速 @> 包含查询）和常用键的 B-tree 表达式索引"""
+    print("🔍 创建 JSONB 索引...")
+
+    # CREATE INDEX CONCURRENTLY 不能在事务块内执行
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index_name, table_name, column_name in GIN_INDEXES:
+            conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON {table_name} USING gin ({column_name} jsonb_path_ops)"
+            ))
+            print(f"  ✅ {index_name} 已就绪")
+
+        for index_name, table_name, column_name, key in EXPRESSION_INDEXES:
+            conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON {table_name} (({column_name} ->> '{key}')) "
+                f"WHERE {column_name} IS NOT NULL"
+            ))
+            print(f"  ✅ {index_name} 已就绪")
+
+    print("🎉 数据库迁移完成！")
+
+
+if __name__ == "__main__":
+    try:
+        convert_json_columns_to_jsonb()
+        create_jsonb_indexes()
+    except Exception as e:
+        print(f"💥 迁移脚本执行失败: {e}")
+        sys.exit(1)
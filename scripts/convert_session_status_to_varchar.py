@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：将 analysis_sessions.status 从 PostgreSQL 原生 ENUM 转换为 VARCHAR + CHECK 约束
+"""
+
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.db.session import get_engine
+from src.db.models import TaskStatus
+
+
+def convert_session_status_to_varchar():
+    """将 status 列转换为 VARCHAR(16)，并把原 ENUM 中的成员名（如 PENDING）改写为枚举值（如 pending）"""
+    print("🚀 开始数据库迁移：status 列转换为 VARCHAR + CHECK")
+
+    check_type_query = text("""
+        SELECT data_type
+        FROM information_schema.columns
+        WHERE table_name = 'analysis_sessions'
+        AND column_name = 'status'
+    """)
+
+    allowed_values = ", ".join(f"'{status.value}'" for status in TaskStatus)
+
+    with get_engine().begin() as conn:
+        row = conn.execute(check_type_query).fetchone()
+
+        if row is None:
+            print("⚠️ analysis_sessions.status 列不存在，跳过")
+            return
+
+        if row.data_type != "USER-DEFINED":
+            print("✅ status 列已是 VARCHAR，跳过类型转换")
+        else:
+            print("🔄 转换 status 列类型...")
+            conn.execute(text("""
+                ALTER TABLE analysis_sessions
+                ALTER COLUMN status TYPE VARCHAR(16) USING lower(status::text)
+            """))
+            conn.execute(text("DROP TYPE IF EXISTS taskstatus"))
+
+        print("➕ 添加 CHECK 约束...")
+        conn.execute(text("ALTER TABLE analysis_sessions DROP CONSTRAINT IF EXISTS ck_sessions_status"))
+        conn.execute(text(
+            f"ALTER TABLE analysis_sessions "
+            f"ADD CONSTRAINT ck_sessions_status CHECK (status IN ({allowed_values}))"
+        ))
+
+    print("✅ 列类型转换完成")
+
+    # CREATE INDEX CONCURRENTLY 不能在事务块内执行
+    print("🔍 创建未结束会话的部分索引...")
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sessions_status_pending
+            ON analysis_sessions (status)
+            WHERE status IN ('pending', 'processing')
+        """))
+
+    print("🎉 数据库迁移完成！")
+
+
+if __name__ == "__main__":
+    try:
+        convert_session_status_to_varchar()
+    except Exception as e:
+        print(f"💥 迁移脚本执行失败: {e}")
+        sys.exit(1)
@@ -0,0 +1,51 @@
+"""
+迁移脚本共用的索引工具函数（PostgreSQL）
+"""
+
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def index_is_valid(conn: Connection, index_name: str) -> Optional[bool]:
+    """
+    查询索引是否有效
+
+    Args:
+        conn: 数据库连接
+        index_name: 索引名
+
+    Returns:
+        Optional[bool]: 索引不存在时返回 None
+    """
+    row = conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:index_name)"),
+        {"index_name": index_name}
+    ).fetchone()
+    return None if row is None else row.indisvalid
+
+
+def create_index_concurrently(conn: Connection, index_name: str, create_sql: str) -> None:
+    """
+    执行 CREATE INDEX CONCURRENTLY IF NOT EXISTS，并确认得到的是有效索引
+
+    上一次并发建索引中途失败会留下 INVALID 索引，IF NOT EXISTS 会直接跳过它；
+    这种情况先删除无效索引再重建。需在 AUTOCOMMIT 连接上调用。
+
+    Args:
+        conn: AUTOCOMMIT 模式的数据库连接
+        index_name: 索引名，需与 create_sql 中的一致
+        create_sql: 建索引语句
+
+    Raises:
+        RuntimeError: 重建后索引仍然无效
+    """
+    if index_is_valid(conn, index_name) is False:
+        print(f"  ⚠️ 发现上次中断遗留的无效索引 {index_name}，删除后重建")
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+
+    conn.execute(text(create_sql))
+
+    if not index_is_valid(conn, index_name):
+        raise RuntimeError(f"索引 {index_name} 无效，已停止迁移")
@@ -1,12 +1,28 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from ....schemas.repository import *
+import asyncio
+import time
 import uuid
+import orjson
+from typing import Optional, Dict, Any, Tuple, AsyncIterator
 from ....services.task_queue import task_queue
-from ....worker.tasks import process_repository_task
-from ....db.session import get_db_session
+from ....core.config import settings
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from ....db.session import AsyncSessionLocal, get_async_db, get_async_engine
 from ....db.models import AnalysisSession, TaskStatus
-from ....services.query_service import QueryService
-from datetime import datetime, timezone
+from ....services.session_cache import (
+    SESSION_STATUS_COLUMNS,
+    build_session_status,
+    bump_bm25_cache_generation,
+    cache_session_status,
+    get_cached_session_status,
+    get_cached_session_status_raw,
+    publish_session_status_async,
+    select_session_status,
+    subscribe_session_events,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,122 +34,269 @@ router = APIRouter(
 )
 
 
+# 终态结果不会再变化，允许浏览器和反向代理缓存，减少重复轮询
+_TERMINAL_CACHE_CONTROL = "public, max-age=300, immutable"
+
+# 会话处于这些状态后不会再有新的状态事件
+_TERMINAL_SESSION_STATUSES = {
+    TaskStatus.SUCCESS.value,
+    TaskStatus.FAILED.value,
+    TaskStatus.CANCELLED.value,
+    TaskStatus.PARTIAL_SUCCESS.value,
+}
+
+
+def _set_cache_control(http_response: Response, session_id: str, status: str, terminal: bool) -> None:
+    """根据任务是否处于终态设置缓存相关的响应头"""
+    if terminal:
+        http_response.headers["Cache-Control"] = _TERMINAL_CACHE_CONTROL
+        http_response.headers["ETag"] = f'"{session_id}-{status}"'
+    else:
+        http_response.headers["Cache-Control"] = "no-store"
+
+
 @router.post("/analyze")
-async def analyze(req: RepoAnalyzeRequest):
+async def analyze(req: RepoAnalyzeRequest, db: AsyncSession = Depends(get_async_db)):
     """
     分析仓库
     接收包含 embedding_config 的请求，并将任务推送到 Celery 队列进行异步处理
     """
+    logger.info("🚀 [API请求] 收到仓库分析请求 - URL: %s", req.repo_url)
+    logger.debug("⚙️ [请求配置] Embedding提供商: %s, 模型: %s", req.embedding_config.provider, req.embedding_config.model_name)
+    
+    # 生成唯一的会话ID
+    session_id = uuid.uuid4().hex
+    logger.debug("🆔 [会话创建] 生成会话ID: %s", session_id)
+    
+    # 预先生成 Celery 任务ID，先落库再投递任务，数据库失败时无需撤销已投递的任务
+    task_id = uuid.uuid4().hex
+    embedding_config = req.embedding_config.model_dump()
+    
+    # 创建数据库会话记录并保存 task_id
+    logger.debug("💾 [数据库] 正在创建会话记录并保存任务ID...")
     try:
-        logger.info(f"🚀 [API请求] 收到仓库分析请求 - URL: {req.repo_url}")
-        logger.info(f"⚙️ [请求配置] Embedding提供商: {req.embedding_config.provider}, 模型: {req.embedding_config.model_name}")
-        
-        # 生成唯一的会话ID
-        session_id = str(uuid.uuid4())
-        logger.info(f"🆔 [会话创建] 生成会话ID: {session_id}")
-        
-        # 将任务推送到 Celery
-        logger.info(f"📤 [任务队列] 正在推送任务到Celery队列...")
-        task = process_repository_task.delay(
-            repo_url=req.repo_url,
-            session_id=session_id,
-            embedding_config=req.embedding_config.model_dump()
-        )
-        logger.info(f"✅ [任务队列] 任务推送成功 - 任务ID: {task.id}")
-        
-        # 创建数据库会话记录并保存 task_id（在同一个事务中）
-        logger.info(f"💾 [数据库] 正在创建会话记录并保存任务ID...")
-        db = get_db_session()
-        try:
-            analysis_session = AnalysisSession(
+        # 直接执行 Core INSERT，不经过 ORM 的 unit of work 和 identity map，也不回读主键
+        await db.execute(
+            insert(AnalysisSession).values(
                 session_id=session_id,
                 repository_url=req.repo_url,
                 status=TaskStatus.PENDING,
-                embedding_config=req.embedding_config.model_dump(),
-                created_at=datetime.now(timezone.utc),
-                task_id=task.id  # 直接在创建时设置task_id
+                embedding_config=embedding_config,
+                task_id=task_id
             )
-            db.add(analysis_session)
-            db.commit()
-            logger.info(f"✅ [数据库] 会话记录创建成功，任务ID已保存: {session_id} -> {task.id}")
-        except Exception as e:
-            logger.error(f"❌ [数据库错误] 创建会话记录失败: {str(e)}")
-            db.rollback()
-            # 如果数据库操作失败，取消已创建的Celery任务
-            try:
-                task.revoke(terminate=True)
-                logger.info(f"🛑 [任务取消] 由于数据库错误，已取消Celery任务: {task.id}")
-            except Exception as revoke_error:
-                logger.error(f"❌ [取消失败] 无法取消Celery任务: {revoke_error}")
-            raise HTTPException(status_code=500, detail=f"Failed to create session: {str(e)}")
-        finally:
-            if db:
-                db.close()
-        
-        response = {
-            "session_id": session_id,
-            "task_id": task.id,
-            "status": "queued",
-            "message": "Repository analysis has been queued for processing"
-        }
-        logger.info(f"🎉 [API响应] 分析请求处理完成 - 会话ID: {session_id}")
-        return response
-        
+        )
+        await db.commit()
+        logger.debug("✅ [数据库] 会话记录创建成功，任务ID已保存: %s -> %s", session_id, task_id)
+    except Exception as e:
+        logger.error("❌ [数据库错误] 创建会话记录失败: %s", e)
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to create session: {str(e)}")
+    
+    # 将任务推送到 Celery
+    logger.debug("📤 [任务队列] 正在推送任务到Celery队列...")
+    try:
+        queued_task_id = await task_queue.push_repository_task(
+            task_id=task_id,
+            repo_url=req.repo_url,
+            session_id=session_id,
+            embedding_config=embedding_config
+        )
+        logger.debug("✅ [任务队列] 任务推送成功 - 任务ID: %s", queued_task_id)
     except Exception as e:
-        logger.error(f"💥 [API错误] 启动分析任务失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to start analysis: {str(e)}")
+        logger.error("❌ [任务队列错误] 推送任务失败: %s", e)
+        # 任务未能投递，将会话标记为失败
+        result = await db.execute(
+            update(AnalysisSession)
+            .where(AnalysisSession.session_id == session_id)
+            .values(
+                status=TaskStatus.FAILED,
+                error_message=f"Failed to queue task: {str(e)}",
+                completed_at=func.now()
+            )
+            .returning(*SESSION_STATUS_COLUMNS)
+        )
+        failed_session = result.first()
+        await db.commit()
+        # 覆盖此前 /status 轮询可能回填的 PENDING 快照
+        if failed_session is not None:
+            await publish_session_status_async(build_session_status(failed_session))
+        raise HTTPException(status_code=500, detail=f"Failed to queue analysis task: {str(e)}")
+    
+    response = {
+        "session_id": session_id,
+        "task_id": queued_task_id,
+        "status": "queued",
+        "message": "Repository analysis has been queued for processing"
+    }
+    logger.info("🎉 [API响应] 分析请求处理完成 - 会话ID: %s", session_id)
+    return response
 
 
-@router.get("/status/{session_id}")
-async def status(session_id: str):
+@router.get("/status/{session_id}", response_model=SessionStatusResponse)
+async def status(
+        session_id: str,
+        http_response: Response,
+        db: AsyncSession = Depends(get_async_db)
+):
     """
     获取分析会话状态
-    从数据库中获取指定会话的状态信息
+    优先从 Redis 状态快照读取，未命中时回退到数据库并回填缓存
+    """
+    logger.debug("📊 [状态查询] 收到状态查询请求 - 会话ID: %s", session_id)
+    
+    raw = await get_cached_session_status_raw(session_id)
+    if raw:
+        # 快照由 build_session_status 生成，结构已经符合响应模型，直接返回原始 JSON，
+        # 跳过响应模型校验和重新序列化
+        status_value = orjson.loads(raw)["status"]
+        logger.debug("⚡ [缓存命中] 会话状态: %s", status_value)
+        cached_response = Response(content=raw, media_type="application/json")
+        _set_cache_control(
+            cached_response, session_id, status_value,
+            status_value in _TERMINAL_SESSION_STATUSES
+        )
+        return cached_response
+    
+    logger.debug("💾 [数据库查询] 正在查询会话状态...")
+    result = await db.execute(select_session_status(session_id))
+    session = result.first()
+    
+    if not session:
+        logger.warning("⚠️ [会话不存在] 未找到会话: %s", session_id)
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    logger.info("✅ [状态获取] 会话状态: %s, 仓库: %s", session.status, session.repository_url)
+    
+    response = build_session_status(session)
+    
+    logger.debug("📈 [进度统计] 处理文件: %s/%s, 索引块: %s/%s", session.processed_files, session.total_files, session.indexed_chunks, session.total_chunks)
+
+    await cache_session_status(response)
+    _set_cache_control(
+        http_response, session_id, response["status"],
+        response["status"] in _TERMINAL_SESSION_STATUSES
+    )
+    return response
+
+
+async def _load_session_status(session_id: str) -> Optional[Dict[str, Any]]:
+    """从数据库读取分析会话状态，会话不存在时返回 None"""
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        result = await db.execute(select_session_status(session_id))
+        session = result.first()
+        return build_session_status(session) if session else None
+
+
+def _bundle_result(session_id: str, task_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """从 get_status_bundle 的返回中取出任务结果，失败时的结构与 get_query_result 一致"""
+    if task_info.get("successful"):
+        return task_info.get("result")
+    if task_info.get("ready"):
+        return {
+            "success": False,
+            "error": task_info.get("error") or "Unknown error",
+            "session_id": session_id,
+            "status": task_info.get("status")
+        }
+    return None
+
+
+async def _initial_session_event(session_id: str) -> Dict[str, Any]:
     """
+    构建 WebSocket 连接建立后推送的初始事件
+
+    分析会话返回状态快照；查询任务已完成时直接返回结果，否则返回当前任务状态
+    """
+    status = await get_cached_session_status(session_id)
+    if status is None:
+        status = await _load_session_status(session_id)
+    if status is not None:
+        return {"type": "status", "data": status}
+
+    # 一次 Redis 往返同时获取查询任务的状态和结果
+    task_info = await task_queue.get_status_bundle(session_id)
+    result = _bundle_result(session_id, task_info)
+    if result is not None:
+        return {"type": "result", "data": result}
+
+    return {"type": "status", "data": {"session_id": session_id, "status": task_info["status"].lower()}}
+
+
+def _is_final_event(event: Dict[str, Any]) -> bool:
+    """判断事件是否为会话的最终事件"""
+    if event.get("type") == "result":
+        return True
+    return event.get("data", {}).get("status") in _TERMINAL_SESSION_STATUSES
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    """持续读取客户端消息（内容忽略），直到客户端断开连接"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+async def _forward_session_events(websocket: WebSocket, pubsub, session_id: str) -> None:
+    """转发会话事件，收到最终事件或超过空闲时间没有新事件时返回"""
+    deadline = time.monotonic() + settings.SESSION_EVENTS_IDLE_TIMEOUT
+    while (remaining := deadline - time.monotonic()) > 0:
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+        if message is None:
+            continue
+        event = orjson.loads(message["data"])
+        await websocket.send_json(event)
+        if _is_final_event(event):
+            return
+        deadline = time.monotonic() + settings.SESSION_EVENTS_IDLE_TIMEOUT
+    logger.info("⏱️ [WebSocket] 长时间没有会话事件，关闭连接 - 会话ID: %s", session_id)
+
+
+@router.websocket("/ws/session/{session_id}")
+async def session_events(websocket: WebSocket, session_id: str):
+    """
+    通过 WebSocket 推送分析会话或查询任务的状态变化和最终结果
+
+    连接建立后先推送一次当前状态，之后转发 Worker 发布的事件，收到最终事件、
+    超过空闲时间或客户端断开后关闭连接并释放订阅连接。
+    REST 状态接口保留用于初始加载和不支持 WebSocket 的客户端。
+    """
+    await websocket.accept()
+    logger.info("🔌 [WebSocket] 客户端已连接 - 会话ID: %s", session_id)
+
     try:
-        logger.info(f"📊 [状态查询] 收到状态查询请求 - 会话ID: {session_id}")
-        
-        db = get_db_session()
-        try:
-            logger.debug(f"💾 [数据库查询] 正在查询会话状态...")
-            session = db.query(AnalysisSession).filter(
-                AnalysisSession.session_id == session_id
-            ).first()
-            
-            if not session:
-                logger.warning(f"⚠️ [会话不存在] 未找到会话: {session_id}")
-                raise HTTPException(status_code=404, detail="Session not found")
-            
-            logger.info(f"✅ [状态获取] 会话状态: {session.status}, 仓库: {session.repository_url}")
-            
-            response = {
-                "session_id": session_id,
-                "status": session.status.value if hasattr(session.status, 'value') else session.status,
-                "repository_url": session.repository_url,
-                "repository_name": session.repository_name,
-                "repository_owner": session.repository_owner,
-                "total_files": session.total_files,
-                "processed_files": session.processed_files,
-                "total_chunks": session.total_chunks,
-                "indexed_chunks": session.indexed_chunks,
-                "created_at": session.created_at.isoformat() if session.created_at else None,
-                "started_at": session.started_at.isoformat() if session.started_at else None,
-                "completed_at": session.completed_at.isoformat() if session.completed_at else None,
-                "error_message": session.error_message
-            }
-            
-            logger.debug(f"📈 [进度统计] 处理文件: {session.processed_files}/{session.total_files}, 索引块: {session.indexed_chunks}/{session.total_chunks}")
-            return response
-            
-        finally:
-            if db:
-                db.close()
-            
-    except HTTPException:
-        raise
+        # 先订阅再读取初始状态，避免遗漏两者之间发布的事件
+        async with subscribe_session_events(session_id) as pubsub:
+            initial_event = await _initial_session_event(session_id)
+            await websocket.send_json(initial_event)
+            if _is_final_event(initial_event):
+                await websocket.close()
+                return
+
+            # 同时等待事件和客户端断开，客户端离开后立即归还订阅连接
+            forward_task = asyncio.create_task(_forward_session_events(websocket, pubsub, session_id))
+            disconnect_task = asyncio.create_task(_wait_for_disconnect(websocket))
+            done, pending = await asyncio.wait(
+                {forward_task, disconnect_task},
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+            if disconnect_task in done:
+                logger.info("🔌 [WebSocket] 客户端已断开 - 会话ID: %s", session_id)
+                return
+            forward_task.result()
+
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logger.info("🔌 [WebSocket] 客户端已断开 - 会话ID: %s", session_id)
     except Exception as e:
-        logger.error(f"❌ [状态查询错误] 获取会话状态失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to get session status: {str(e)}")
+        logger.error("❌ [WebSocket错误] 推送会话事件失败 - 会话ID: %s, 错误: %s", session_id, e)
+        await websocket.close(code=1011)
+
 
 @router.post("/query")
 async def query(req: QueryRequest):
@@ -141,21 +304,21 @@ async def query(req: QueryRequest):
     Receive requests containing generation_mode and llm_config, then push to Celery
     for async processing
     """
-    logger.info(f"🔍 [查询请求] 收到查询请求 - 目标会话: {req.session_id}")
-    logger.info(f"❓ [查询内容] 问题: {req.question[:100]}{'...' if len(req.question) > 100 else ''}")
-    logger.info(f"⚙️ [查询配置] 生成模式: {req.generation_mode}")
+    logger.info("🔍 [查询请求] 收到查询请求 - 目标会话: %s", req.session_id)
+    logger.debug("❓ [查询内容] 问题: %.100s%s", req.question, '...' if len(req.question) > 100 else '')
+    logger.debug("⚙️ [查询配置] 生成模式: %s", req.generation_mode)
     
     if req.llm_config:
-        logger.info(f"🤖 [LLM配置] 提供商: {req.llm_config.provider}, 模型: {req.llm_config.model_name}")
+        logger.debug("🤖 [LLM配置] 提供商: %s, 模型: %s", req.llm_config.provider, req.llm_config.model_name)
     
     # 生成唯一的session_id
-    session_id = str(uuid.uuid4())
-    logger.info(f"🆔 [任务会话] 生成查询任务会话ID: {session_id}")
+    session_id = uuid.uuid4().hex
+    logger.debug("🆔 [任务会话] 生成查询任务会话ID: %s", session_id)
     
     # 将任务推送到Celery
-    logger.info(f"📤 [任务队列] 正在推送查询任务到队列...")
+    logger.debug("📤 [任务队列] 正在推送查询任务到队列...")
     task_id = await task_queue.push_query_task(session_id, req)
-    logger.info(f"✅ [任务队列] 查询任务推送成功 - 任务ID: {task_id}")
+    logger.debug("✅ [任务队列] 查询任务推送成功 - 任务ID: %s", task_id)
     
     response = {
         "session_id": session_id,
@@ -164,161 +327,285 @@ async def query(req: QueryRequest):
         "message": "Query task has been queued for processing"
     }
     
-    logger.info(f"🎉 [查询响应] 查询请求处理完成 - 任务会话ID: {session_id}")
+    logger.info("🎉 [查询响应] 查询请求处理完成 - 任务会话ID: %s", session_id)
     return response
 
 @router.delete("/analyze/{session_id}")
-async def cancel_analysis(session_id: str):
+async def cancel_analysis(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     停止仓库分析任务
     """
+    logger.info("🛑 [停止请求] 收到停止仓库分析请求 - 会话ID: %s", session_id)
+    
+    # 从数据库获取任务信息
     try:
-        logger.info(f"🛑 [停止请求] 收到停止仓库分析请求 - 会话ID: {session_id}")
+        final_statuses = [TaskStatus.SUCCESS, TaskStatus.FAILED, TaskStatus.CANCELLED, TaskStatus.PARTIAL_SUCCESS]
         
-        # 从数据库获取任务信息
-        db = get_db_session()
-        try:
-            analysis_session = db.query(AnalysisSession).filter(
-                AnalysisSession.session_id == session_id
-            ).first()
+        # 用一条 UPDATE ... RETURNING 完成检查和状态变更，避免先查询再更新期间状态被 Worker 改写
+        result = await db.execute(
+            update(AnalysisSession)
+            .where(
+                AnalysisSession.session_id == session_id,
+                AnalysisSession.status.notin_(final_statuses),
+                AnalysisSession.task_id.isnot(None)
+            )
+            .values(
+                status=TaskStatus.CANCELLED,
+                completed_at=func.now(),
+                error_message="Task cancelled by user request"
+            )
+            .returning(AnalysisSession)
+        )
+        analysis_session = result.scalar_one_or_none()
+        
+        if not analysis_session:
+            # 没有可取消的记录，再查询一次以区分具体原因
+            await db.rollback()
+            result = await db.execute(
+                select(AnalysisSession.status).where(AnalysisSession.session_id == session_id)
+            )
+            current_status = result.scalar_one_or_none()
             
-            if not analysis_session:
-                logger.warning(f"⚠️ [会话不存在] 未找到会话 - 会话ID: {session_id}")
+            if current_status is None:
+                logger.warning("⚠️ [会话不存在] 未找到会话 - 会话ID: %s", session_id)
                 raise HTTPException(status_code=404, detail="Analysis session not found")
             
-            # 检查任务状态
-            if analysis_session.status in [TaskStatus.SUCCESS, TaskStatus.FAILED, TaskStatus.CANCELLED]:
-                logger.info(f"ℹ️ [任务已完成] 任务已处于终态 - 状态: {analysis_session.status.value}")
+            if current_status in final_statuses:
+                logger.info("ℹ️ [任务已完成] 任务已处于终态 - 状态: %s", current_status.value)
                 return {
                     "session_id": session_id,
-                    "status": analysis_session.status.value,
-                    "message": f"Task is already in final state: {analysis_session.status.value}"
+                    "status": current_status.value,
+                    "message": f"Task is already in final state: {current_status.value}"
                 }
             
-            # 获取 Celery 任务ID
-            task_id = analysis_session.task_id
-            if not task_id:
-                logger.error(f"❌ [任务ID缺失] 会话缺少任务ID - 会话ID: {session_id}")
-                raise HTTPException(status_code=400, detail="Task ID not found for this session")
-            
-            # 取消 Celery 任务
-            logger.info(f"🛑 [取消任务] 正在取消Celery任务 - 任务ID: {task_id}")
-            cancel_success = await task_queue.cancel_repository_task(task_id)
+            logger.error("❌ [任务ID缺失] 会话缺少任务ID - 会话ID: %s", session_id)
+            raise HTTPException(status_code=400, detail="Task ID not found for this session")
+        
+        # 先提交状态变更释放行锁，再撤销 Celery 任务，避免等待 broker 期间阻塞 Worker 的状态写入
+        task_id = analysis_session.task_id
+        await db.commit()
+        await publish_session_status_async(build_session_status(analysis_session))
+        
+        logger.debug("🛑 [取消任务] 正在取消Celery任务 - 任务ID: %s", task_id)
+        cancel_success = await task_queue.cancel_repository_task(task_id)
+        
+        if cancel_success:
+            logger.info("✅ [取消成功] 仓库分析任务已成功取消 - 会话ID: %s", session_id)
+            return {
+                "session_id": session_id,
+                "status": "cancelled",
+                "message": "Repository analysis task has been cancelled successfully"
+            }
+        else:
+            logger.error("❌ [取消失败] 会话已标记为取消，但无法撤销Celery任务 - 任务ID: %s", task_id)
+            raise HTTPException(status_code=500, detail="Session marked as cancelled but failed to revoke the task")
             
-            if cancel_success:
-                # 更新数据库状态为已取消
-                analysis_session.status = TaskStatus.CANCELLED
-                analysis_session.completed_at = datetime.now(timezone.utc)
-                analysis_session.error_message = "Task cancelled by user request"
-                db.commit()
-                
-                logger.info(f"✅ [取消成功] 仓库分析任务已成功取消 - 会话ID: {session_id}")
-                return {
-                    "session_id": session_id,
-                    "status": "cancelled",
-                    "message": "Repository analysis task has been cancelled successfully"
-                }
-            else:
-                logger.error(f"❌ [取消失败] 无法取消Celery任务 - 任务ID: {task_id}")
-                raise HTTPException(status_code=500, detail="Failed to cancel the task")
-                
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"❌ [数据库错误] 停止任务时发生数据库错误: {str(e)}")
-            db.rollback()
-            raise HTTPException(status_code=500, detail="Database error while cancelling task")
-        finally:
-            if db:
-                db.close()
-                
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"💥 [停止错误] 停止仓库分析任务失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to cancel analysis: {str(e)}")
+        logger.error("❌ [数据库错误] 停止任务时发生数据库错误: %s", e)
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Database error while cancelling task")
+
+
+# 查询任务状态的进程内短时缓存：session_id -> (写入时间, 响应)
+# 多个轮询方同时查询同一任务时，每个会话每秒最多访问一次 Redis
+_QUERY_STATUS_CACHE_TTL = 1.0
+_QUERY_STATUS_CACHE_MAX_SIZE = 1024
+_query_status_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+# 终态不缓存，客户端拿到后即应停止轮询
+_TERMINAL_TASK_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+# Celery 任务状态对应的提示信息
+_STATUS_MSG = {
+    "PENDING": "Task is queued and waiting to be processed",
+    "STARTED": "Task is currently being processed",
+    "SUCCESS": "Task completed successfully",
+    "FAILURE": "Task failed to complete",
+    "RETRY": "Task is being retried",
+    "REVOKED": "Task was cancelled"
+}
+
+
+def _cache_query_status(session_id: str, response: Dict[str, Any]) -> None:
+    """写入查询状态缓存，超过容量时清理已过期的条目"""
+    now = time.monotonic()
+    if len(_query_status_cache) >= _QUERY_STATUS_CACHE_MAX_SIZE:
+        expired = [
+            key for key, (cached_at, _) in _query_status_cache.items()
+            if now - cached_at >= _QUERY_STATUS_CACHE_TTL
+        ]
+        for key in expired:
+            del _query_status_cache[key]
+    _query_status_cache[session_id] = (now, response)
+
+
+def _query_status_response(session_id: str, task_info: Dict[str, Any]) -> Dict[str, Any]:
+    """由 get_status_bundle 的返回构建查询状态响应（不包含结果数据）"""
+    status = task_info.get("status", "UNKNOWN")
+    
+    response = {
+        "session_id": session_id,
+        "status": status.lower(),
+        "ready": task_info.get("ready", False),
+        "successful": task_info.get("successful"),
+        "message": _STATUS_MSG.get(status, "Task status unknown")
+    }
+    
+    # 如果任务失败，包含错误信息但不包含完整结果
+    if status == "FAILURE" and task_info.get("error"):
+        response["error"] = task_info.get("error")
+        logger.error("❌ [任务失败] 查询任务失败 - 错误: %s", task_info.get('error'))
+    
+    return response
+
+
+@router.post("/query/status/batch")
+async def batch_query_status(req: BatchQueryStatusRequest):
+    """
+    Get the basic status of multiple query tasks in one request
+    All statuses are read with a single Redis MGET; each item has the same shape as query_status
+    """
+    logger.debug("📊 [批量查询状态] 收到批量查询状态请求 - 任务数: %s", len(req.session_ids))
+    
+    task_infos = await task_queue.get_status_bundles(req.session_ids)
+    return [
+        _query_status_response(session_id, task_info)
+        for session_id, task_info in zip(req.session_ids, task_infos)
+    ]
 
 
 @router.get("/query/status/{session_id}")
-async def query_status(session_id: str):
+async def query_status(session_id: str, http_response: Response):
     """
     Get only the basic status information of a query task (without result data)
     Returns: task status, progress info, and basic metadata - optimized for frequent polling
     """
-    try:
-        logger.info(f"📊 [查询状态] 收到查询状态请求 - 任务会话ID: {session_id}")
-        
-        logger.debug(f"🔍 [状态检查] 正在获取任务状态...")
-        status = await task_queue.get_task_status(session_id)
-        
-        # 获取基本任务信息（不包含完整结果）
-        task_info = await task_queue.get_task_info(session_id)
-        
-        response = {
-            "session_id": session_id,
-            "status": status.lower(),
-            "ready": task_info.get("ready", False),
-            "successful": task_info.get("successful"),
-            "message": {
-                "PENDING": "Task is queued and waiting to be processed",
-                "STARTED": "Task is currently being processed", 
-                "SUCCESS": "Task completed successfully",
-                "FAILURE": "Task failed to complete",
-                "RETRY": "Task is being retried",
-                "REVOKED": "Task was cancelled"
-            }.get(status, "Task status unknown")
-        }
-        
-        # 如果任务失败，包含错误信息但不包含完整结果
-        if status == "FAILURE" and task_info.get("error"):
-            response["error"] = task_info.get("error")
-            logger.error(f"❌ [任务失败] 查询任务失败 - 错误: {task_info.get('error')}")
-        
-        logger.info(f"📈 [状态响应] 任务状态: {status}, 是否就绪: {task_info.get('ready', False)}")
-        return response
+    logger.debug("📊 [查询状态] 收到查询状态请求 - 任务会话ID: %s", session_id)
+    
+    cached = _query_status_cache.get(session_id)
+    if cached and time.monotonic() - cached[0] < _QUERY_STATUS_CACHE_TTL:
+        logger.debug("⚡ [缓存命中] 查询任务状态: %s", cached[1]['status'])
+        _set_cache_control(http_response, session_id, cached[1]["status"], terminal=False)
+        return cached[1]
+    
+    logger.debug("🔍 [状态检查] 正在获取任务状态...")
+    # 一次 Redis 往返同时获取状态和基本任务信息
+    task_info = await task_queue.get_status_bundle(session_id)
+    status = task_info.get("status", "UNKNOWN")
+    response = _query_status_response(session_id, task_info)
+    
+    terminal = status in _TERMINAL_TASK_STATES
+    if not terminal:
+        _cache_query_status(session_id, response)
+    else:
+        _query_status_cache.pop(session_id, None)
+    _set_cache_control(http_response, session_id, response["status"], terminal)
+    
+    logger.info("📈 [状态响应] 任务状态: %s, 是否就绪: %s", status, task_info.get('ready', False))
+    return response
+
+
+# 长轮询期间每个请求独占一个订阅连接，限制同时等待的请求数
+_query_status_waiters = asyncio.Semaphore(settings.QUERY_STATUS_MAX_WAITERS)
+
+
+@router.get("/query/status/{session_id}/wait")
+async def wait_query_status(
+        session_id: str,
+        http_response: Response,
+        timeout: float = Query(25.0, gt=0, le=60)
+):
+    """
+    Long-poll the status of a query task
+    Returns immediately if the task has finished, otherwise waits until the result
+    is published or the timeout elapses. Response shape is the same as query_status
+    """
+    if _query_status_waiters.locked():
+        # 等待中的请求已达上限，退化为普通轮询
+        logger.debug("⚠️ [长轮询] 等待请求数已达上限，直接返回当前状态 - 任务会话ID: %s", session_id)
+        return await query_status(session_id, http_response)
+    
+    async with _query_status_waiters, subscribe_session_events(session_id) as pubsub:
+        # 先订阅再检查状态，避免任务恰好在两者之间完成时漏掉结果事件
+        response = await query_status(session_id, http_response)
+        if response["status"].upper() in _TERMINAL_TASK_STATES:
+            return response
         
-    except Exception as e:
-        logger.error(f"❌ [状态查询错误] 获取查询任务状态失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error retrieving task status: {str(e)}")
+        logger.debug("⏳ [长轮询] 等待查询结果 - 任务会话ID: %s, 超时: %ss", session_id, timeout)
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message and orjson.loads(message["data"]).get("type") == "result":
+                break
+    
+    # 丢弃等待前写入的短时缓存，返回最新状态
+    _query_status_cache.pop(session_id, None)
+    return await query_status(session_id, http_response)
+
+
+async def _iter_query_data_json(query_data: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """
+    分段序列化查询结果
+
+    retrieved_context 中的每个文档块单独序列化后输出，不必先在内存中拼出完整的 JSON，
+    客户端也能更早收到首个字节
+    """
+    prefix = b"{"
+    for key, value in query_data.items():
+        if key == "retrieved_context":
+            continue
+        yield prefix + orjson.dumps(key) + b":" + orjson.dumps(value)
+        prefix = b","
+    
+    yield prefix + b'"retrieved_context":['
+    for index, chunk in enumerate(query_data["retrieved_context"]):
+        yield (b"," if index else b"") + orjson.dumps(chunk)
+    yield b"]}"
+
 
 @router.get("/query/result/{session_id}")
-async def query_result(session_id: str):
+async def query_result(session_id: str, http_response: Response):
     """
     Get only the final result data of a completed query task
     Returns: the actual query response data (answer, retrieved_context, etc.) without status metadata
     """
-    try:
-        logger.info(f"📄 [结果获取] 收到查询结果请求 - 任务会话ID: {session_id}")
-        
-        result = await task_queue.get_query_result(session_id)
-        
-        if result is None:
-            logger.warning(f"⚠️ [结果未找到] 任务结果不存在或仍在处理中 - 会话ID: {session_id}")
-            raise HTTPException(status_code=404, detail="Task result not found or still processing")
-        
-        # 检查任务是否失败
-        if isinstance(result, dict) and result.get("success") == False:
-            error_msg = result.get('error', 'Unknown error')
-            logger.error(f"❌ [任务失败] 查询任务失败 - 错误: {error_msg}")
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Task failed: {error_msg}"
+    logger.debug("📄 [结果获取] 收到查询结果请求 - 任务会话ID: %s", session_id)
+    
+    result = await task_queue.get_query_result(session_id)
+    
+    if result is None:
+        logger.warning("⚠️ [结果未找到] 任务结果不存在或仍在处理中 - 会话ID: %s", session_id)
+        raise HTTPException(status_code=404, detail="Task result not found or still processing")
+    
+    # 检查任务是否失败
+    if isinstance(result, dict) and result.get("success") == False:
+        error_msg = result.get('error', 'Unknown error')
+        logger.error("❌ [任务失败] 查询任务失败 - 错误: %s", error_msg)
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Task failed: {error_msg}"
+        )
+    
+    # 结果已生成，之后不会再变化
+    _set_cache_control(http_response, session_id, "success", terminal=True)
+    
+    # 只返回实际的查询数据，去除包装层
+    if isinstance(result, dict) and "data" in result:
+        query_data = result["data"]
+        logger.info("✅ [结果返回] 成功返回查询数据 - 包含答案和上下文")
+        if isinstance(query_data, dict) and isinstance(query_data.get("retrieved_context"), list):
+            # 直接返回 Response 时不会合并注入的 http_response 头，需要显式传入
+            return StreamingResponse(
+                _iter_query_data_json(query_data),
+                media_type="application/json",
+                headers=dict(http_response.headers)
             )
-        
-        # 只返回实际的查询数据，去除包装层
-        if isinstance(result, dict) and "data" in result:
-            query_data = result["data"]
-            logger.info(f"✅ [结果返回] 成功返回查询数据 - 包含答案和上下文")
-            return query_data
-        else:
-            logger.info(f"✅ [结果返回] 成功返回查询结果")
-            return result
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"❌ [结果获取错误] 获取查询结果失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error retrieving result: {str(e)}")
+        return query_data
+    else:
+        logger.info("✅ [结果返回] 成功返回查询结果")
+        return result
 
 @router.get("/query/info/{session_id}")
 async def query_task_info(session_id: str):
@@ -326,78 +613,67 @@ async def query_task_info(session_id: str):
     Get comprehensive task information including status, result, timing, and debug info
     Returns: complete task metadata with execution details - ideal for debugging and monitoring
     """
-    try:
-        logger.info(f"🔍 [任务信息] 收到任务信息查询请求 - 任务会话ID: {session_id}")
-        
-        # 获取基础任务信息
-        task_info = await task_queue.get_task_info(session_id)
-        
-        # 获取完整结果（如果可用）
-        result = await task_queue.get_query_result(session_id)
-        
-        # 构建增强的任务信息响应
-        enhanced_info = {
-            "session": session_id,
-            "status": task_info.get("status", "UNKNOWN"),
-            "ready": task_info.get("ready", False),
-            "successful": task_info.get("successful"),
-            "execution_info": {
-                "has_result": result is not None,
-                "result_type": type(result).__name__ if result else None,
-                "error": task_info.get("error"),
-                "traceback": task_info.get("traceback")
-            }
+    logger.debug("🔍 [任务信息] 收到任务信息查询请求 - 任务会话ID: %s", session_id)
+    
+    # 一次 Redis 往返获取基础任务信息和完整结果
+    task_info = await task_queue.get_status_bundle(session_id)
+    
+    # 获取完整结果（如果可用）
+    result = _bundle_result(session_id, task_info)
+    
+    # 构建增强的任务信息响应
+    enhanced_info = {
+        "session": session_id,
+        "status": task_info.get("status", "UNKNOWN"),
+        "ready": task_info.get("ready", False),
+        "successful": task_info.get("successful"),
+        "execution_info": {
+            "has_result": result is not None,
+            "result_type": type(result).__name__ if result else None,
+            "error": task_info.get("error"),
+            "traceback": task_info.get("traceback")
         }
-        
-        # 如果有结果，添加结果摘要信息
-        if result and isinstance(result, dict):
-            if result.get("success") and "data" in result:
-                data = result["data"]
-                enhanced_info["result_summary"] = {
-                    "success": True,
-                    "has_answer": "answer" in data if isinstance(data, dict) else False,
-                    "context_chunks": len(data.get("retrieved_context", [])) if isinstance(data, dict) else 0,
-                    "generation_mode": data.get("generation_mode") if isinstance(data, dict) else None,
-                    "timing": {
-                        "retrieval_time": data.get("retrieval_time") if isinstance(data, dict) else None,
-                        "generation_time": data.get("generation_time") if isinstance(data, dict) else None,
-                        "total_time": data.get("total_time") if isinstance(data, dict) else None
-                    }
-                }
-            else:
-                enhanced_info["result_summary"] = {
-                    "success": False,
-                    "error": result.get("error", "Unknown error")
+    }
+    
+    # 如果有结果，添加结果摘要信息
+    if result and isinstance(result, dict):
+        if result.get("success") and "data" in result:
+            data = result["data"]
+            enhanced_info["result_summary"] = {
+                "success": True,
+                "has_answer": "answer" in data if isinstance(data, dict) else False,
+                "context_chunks": len(data.get("retrieved_context", [])) if isinstance(data, dict) else 0,
+                "generation_mode": data.get("generation_mode") if isinstance(data, dict) else None,
+                "timing": {
+                    "retrieval_time": data.get("retrieval_time") if isinstance(data, dict) else None,
+                    "generation_time": data.get("generation_time") if isinstance(data, dict) else None,
+                    "total_time": data.get("total_time") if isinstance(data, dict) else None
                 }
-        
-        # 如果需要完整结果，可以选择性包含
-        # enhanced_info["full_result"] = result  # 可选：包含完整结果
-        
-        logger.info(f"📊 [信息汇总] 任务状态: {enhanced_info['status']}, 是否成功: {enhanced_info['successful']}, 有结果: {enhanced_info['execution_info']['has_result']}")
-        return enhanced_info
-        
-    except Exception as e:
-        logger.error(f"❌ [信息获取错误] 获取任务信息失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error retrieving task info: {str(e)}")
+            }
+        else:
+            enhanced_info["result_summary"] = {
+                "success": False,
+                "error": result.get("error", "Unknown error")
+            }
+    
+    # 如果需要完整结果，可以选择性包含
+    # enhanced_info["full_result"] = result  # 可选：包含完整结果
+    
+    logger.info("📊 [信息汇总] 任务状态: %s, 是否成功: %s, 有结果: %s", enhanced_info['status'], enhanced_info['successful'], enhanced_info['execution_info']['has_result'])
+    return enhanced_info
 
 @router.delete("/cache")
 async def clear_cache():
     """
     Clear BM25 cache to apply improved tokenization and file name matching logic
     """
-    try:
-        logger.info("🧹 [缓存清理] 收到清除BM25缓存请求")
-        
-        # 创建QueryService实例并清除缓存
-        query_service = QueryService()
-        query_service.clear_cache()
-        
-        logger.info("✅ [缓存清理] BM25缓存已成功清除")
-        return {
-            "status": "success",
-            "message": "BM25 cache cleared successfully"
-        }
-        
-    except Exception as e:
-        logger.error(f"❌ [缓存清理错误] 清除BM25缓存失败: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to clear cache: {str(e)}")
+    logger.debug("🧹 [缓存清理] 收到清除BM25缓存请求")
+    
+    # 查询在 Worker 进程中执行，通过递增 Redis 中的缓存代数通知各 Worker 在下次查询前清空缓存
+    await bump_bm25_cache_generation()
+    
+    logger.info("✅ [缓存清理] 已通知所有Worker清除BM25缓存")
+    return {
+        "status": "success",
+        "message": "BM25 cache cleared successfully"
+    }
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 import os
+import re
+import stat
 import logging
 from pathlib import Path
 
@@ -32,49 +34,74 @@ class BatchUpdateRequest(BaseModel):
     settings: Dict[str, str]
 
 
-def get_env() -> tuple[bool, str, Optional[Dict[str, str]]]:
-    """读取.env文件中的所有环境变量"""
+# 已解析的 .env 内容缓存，文件修改时间变化时失效
+_env_cache: Dict[str, Any] = {"mtime": None, "vars": {}}
 
-    if not env_path.exists():
-        return False, f".env文件不存在于目录{env_path}", None
 
-    try:
-        env_vars = {}
+# .env 键值对：KEY=VALUE，键和值两端的空白不计入
+_ENV_LINE_RE = re.compile(r"^[^\S\r\n]*([^#\s=][^=\r\n]*?)[^\S\r\n]*=[^\S\r\n]*(.*?)[^\S\r\n]*\r?$", re.MULTILINE)
+# 既不是空行、注释也不包含等号的行
+_ENV_MALFORMED_RE = re.compile(r"^[^\S\r\n]*[^#\s=][^=\r\n]*$", re.MULTILINE)
 
-        with open(env_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
 
-                # 跳过空行和注释行
-                if not line or line.startswith('#'):
-                    continue
+def _parse_env_text(data: str) -> Dict[str, str]:
+    """解析 .env 文件内容为键值对，整个文件用一次正则匹配完成"""
+    env_vars = {}
 
-                # 检查是否包含等号
-                if '=' not in line:
-                    logger.warning(f"第{line_num}行格式不正确，跳过: {line}")
-                    continue
+    for key, value in _ENV_LINE_RE.findall(data):
+        # 移除值两端的引号（如果存在）
+        if value[:1] in ('"', "'") and value.endswith(value[0]):
+            value = value[1:-1]
+        env_vars[key] = value
 
-                # 分割键值对
-                key, value = line.split('=', 1)
-                key = key.strip()
-                value = value.strip()
+    malformed = len(_ENV_MALFORMED_RE.findall(data))
+    if malformed:
+        logger.warning(f".env文件中有{malformed}行格式不正确，已跳过")
+
+    return env_vars
 
-                # 移除值两端的引号（如果存在）
-                if value.startswith('"') and value.endswith('"'):
-                    value = value[1:-1]
-                elif value.startswith("'") and value.endswith("'"):
-                    value = value[1:-1]
 
-                env_vars[key] = value
+def get_env() -> tuple[bool, str, Optional[Dict[str, str]]]:
+    """读取.env文件中的所有环境变量（文件未修改时直接返回缓存）"""
 
+    if not env_path.exists():
+        return False, f".env文件不存在于目录{env_path}", None
+
+    try:
+        mtime = env_path.stat().st_mtime_ns
+        if mtime != _env_cache["mtime"]:
+            _env_cache["vars"] = _parse_env_text(env_path.read_text(encoding='utf-8'))
+            _env_cache["mtime"] = mtime
+
+        env_vars = dict(_env_cache["vars"])
         return True, f"成功读取{len(env_vars)}个环境变量", env_vars
 
     except Exception as e:
         logger.error(f"读取环境变量失败: {str(e)}")
         return False, f"读取失败: {str(e)}", None
 
-def update_env(key: str, value: str) -> tuple[bool, str, Optional[str]]:
-    """更新.env文件中的环境变量"""
+
+def _is_valid_env_key(key: str) -> bool:
+    """键为空或包含等号、换行时会写出格式错误的 .env 行"""
+    return bool(key) and '=' not in key and '\n' not in key and '\r' not in key
+
+
+def update_env_many(items: Dict[str, str]) -> tuple[bool, str, Optional[Dict[str, Optional[str]]]]:
+    """
+    批量更新.env文件中的环境变量
+
+    只读取和写入一次文件，写入时先写临时文件再原子替换；存在无效的键时不写入任何内容
+
+    Args:
+        items: 要更新的键值对
+
+    Returns:
+        tuple: (是否成功, 提示信息, 每个键的旧值)
+    """
+
+    invalid_keys = [key for key in items if not _is_valid_env_key(key)]
+    if invalid_keys:
+        return False, f"无效的环境变量名: {invalid_keys!r}", None
 
     if not env_path.exists():
         return False, f".env文件不存在于目录{env_path}", None
@@ -84,40 +111,62 @@ def update_env(key: str, value: str) -> tuple[bool, str, Optional[str]]:
         with open(env_path, 'r', encoding='utf-8') as f:
             lines = f.readlines()
 
-        # 查找并更新变量
-        updated = False
-        old_value = None
+        # 一次遍历完成查找和替换
+        old_values: Dict[str, Optional[str]] = {key: None for key in items}
+        updated = set()
         new_lines = []
 
         for line in lines:
-            if line.strip() and not line.strip().startswith('#'):
-                if '=' in line and line.split('=')[0].strip() == key:
-                    old_value = line.split('=', 1)[1].strip()
-                    new_lines.append(f"{key}={value}\n")
-                    updated = True
-                else:
-                    new_lines.append(line)
-            else:
-                new_lines.append(line)
+            stripped = line.strip()
+            if stripped and not stripped.startswith('#') and '=' in line:
+                key, old_value = line.split('=', 1)
+                key = key.strip()
+                if key in items:
+                    if key not in updated:
+                        old_values[key] = old_value.strip()
+                        updated.add(key)
+                    new_lines.append(f"{key}={items[key]}\n")
+                    continue
+            new_lines.append(line)
 
         # 如果变量不存在，添加新变量
-        if not updated:
-            new_lines.append(f"{key}={value}\n")
-
-        # 写回文件
-        with open(env_path, 'w', encoding='utf-8') as f:
+        for key, value in items.items():
+            if key not in updated:
+                new_lines.append(f"{key}={value}\n")
+
+        # 写入临时文件后原子替换，避免读取方看到写了一半的文件；
+        # 替换解析后的真实路径，.env 为符号链接时保留链接，并沿用原文件的权限（密钥文件常为 0600）
+        target_path = env_path.resolve()
+        tmp_path = target_path.with_name(target_path.name + ".tmp")
+        mode = stat.S_IMODE(target_path.stat().st_mode)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        # 写入内容前再设置一次权限，不受 umask 和上次遗留的临时文件影响
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             f.writelines(new_lines)
+        os.replace(tmp_path, target_path)
+        _env_cache["mtime"] = None
 
         # 更新运行时环境变量
-        os.environ[key] = value
+        os.environ.update(items)
 
-        return True, f"环境变量{key}更新成功", old_value
+        return True, f"成功更新{len(items)}个环境变量", old_values
 
     except Exception as e:
         logger.error(f"更新环境变量失败: {str(e)}")
         return False, f"更新失败: {str(e)}", None
 
 
+def update_env(key: str, value: str) -> tuple[bool, str, Optional[str]]:
+    """更新.env文件中的环境变量"""
+    success, message, old_values = update_env_many({key: value})
+
+    if not success:
+        return False, message, None
+
+    return True, f"环境变量{key}更新成功", old_values[key]
+
+
 @router.get("/", response_model=SettingsResponse)
 async def get_settings():
     """获取当前环境变量配置"""
@@ -136,10 +185,10 @@ async def get_settings():
 @router.put("/", response_model=SettingUpdateResponse)
 async def update_setting(request: SettingUpdateRequest):
     """更新单个环境变量"""
-    if request.key != request.key:
+    if not _is_valid_env_key(request.key):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="路径参数与请求体中的key不匹配"
+            detail=f"无效的环境变量名: {request.key!r}"
         )
 
     success, message, old_value = update_env(request.key, request.value)
@@ -164,13 +213,15 @@ async def update_settings_batch(request: BatchUpdateRequest):
     """批量更新环境变量"""
     try:
         updated_count = 0
-        failed = []
-        for key, value in request.settings.items():
-            success, _, _ = update_env(key, value)
+        # 无效的键直接计入失败，其余的键照常写入
+        failed = [key for key in request.settings if not _is_valid_env_key(key)]
+        valid_settings = {key: value for key, value in request.settings.items() if _is_valid_env_key(key)}
+        if valid_settings:
+            success, _, _ = update_env_many(valid_settings)
             if success:
-                updated_count += 1
+                updated_count = len(valid_settings)
             else:
-                failed.append(key)
+                failed.extend(valid_settings)
 
         logger.info(f"批量更新完成，成功更新 {updated_count} 个环境变量")
 
@@ -5,8 +5,9 @@
 
 import json
 import logging
+from functools import lru_cache, cached_property
 from pathlib import Path
-from typing import List, Optional
+from typing import FrozenSet, List, Optional
 
 from dotenv import load_dotenv
 from pydantic import field_validator, ValidationInfo
@@ -18,6 +19,20 @@ if env_path.is_file():
     load_dotenv(dotenv_path=env_path)
 
 
+def _parse_list_value(v: str) -> List[str]:
+    """将 JSON 数组或逗号分隔的字符串解析为列表（各列表类配置共用）"""
+    # 只有形如 [...] 的字符串才尝试按 JSON 解析
+    if v[:1] == "[" and v[-1:] == "]":
+        try:
+            parsed = json.loads(v)
+            if isinstance(parsed, list):
+                return [str(item).strip() for item in parsed if item]
+        except json.JSONDecodeError:
+            pass
+
+    return [item.strip() for item in v.split(",") if item.strip()]
+
+
 class Settings(BaseSettings):
     """应用配置模型"""
     model_config = SettingsConfigDict(
@@ -42,19 +57,12 @@ class Settings(BaseSettings):
             return []
 
         # 去除可能的引号
-        v = v.strip().strip("'\"")
-
-        # 如果是 JSON 数组格式
-        if v.startswith("[") and v.endswith("]"):
-            try:
-                parsed = json.loads(v)
-                if isinstance(parsed, list):
-                    return [str(url).strip() for url in parsed if url]
-            except json.JSONDecodeError:
-                pass
+        return _parse_list_value(v.strip().strip("'\""))
 
-        # 否则作为逗号分隔的字符串处理
-        return [url.strip() for url in v.split(",") if url.strip()]
+    # 健康检查结果的进程内缓存时间 (秒)，避免探针频繁请求时反复探测各后端
+    HEALTH_CHECK_CACHE_TTL: float = 5.0
+    # 健康检查中单个后端探测的超时时间 (秒)
+    HEALTH_CHECK_TIMEOUT: float = 1.0
 
     # --- 服务端口配置 ---
     API_HOST: str = "0.0.0.0"
@@ -78,6 +86,11 @@ class Settings(BaseSettings):
             f"@{values.get('POSTGRES_HOST')}:{values.get('POSTGRES_PORT')}/{values.get('POSTGRES_DB')}"
         )
 
+    # 数据库连接池配置
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 3600
+
     # --- 消息队列配置 (Redis) ---
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
@@ -91,11 +104,28 @@ class Settings(BaseSettings):
         values = info.data
         return f"redis://{values.get('REDIS_HOST')}:{values.get('REDIS_PORT')}/{values.get('REDIS_DB', 0)}"
 
+    # Redis 连接池大小（每个进程）
+    REDIS_MAX_CONNECTIONS: int = 64
+    # 发布/订阅专用连接池大小（每个进程），每个 WebSocket 和长轮询各占用一个连接，与命令连接池分开
+    REDIS_PUBSUB_MAX_CONNECTIONS: int = 256
+    # 每个进程同时挂起的查询状态长轮询上限，超出时立即返回当前状态，为 WebSocket 预留订阅连接
+    QUERY_STATUS_MAX_WAITERS: int = 128
+    # WebSocket 连续多久没有收到会话事件后主动关闭 (秒)
+    SESSION_EVENTS_IDLE_TIMEOUT: float = 300.0
+    # 会话状态快照在 Redis 中的过期时间 (秒)
+    SESSION_STATUS_CACHE_TTL: int = 86400
+    # 查询结果在 Redis 中的过期时间 (秒)，与 Celery 的 result_expires 保持一致
+    QUERY_RESULT_CACHE_TTL: int = 3600
+
     # --- Celery 配置 ---
     CELERY_BROKER_URL: Optional[str] = None
     CELERY_RESULT_BACKEND: Optional[str] = None
     CELERY_WORKER_PREFETCH_MULTIPLIER: int = 1
     CELERY_RESULT_EXPIRES: int = 3600
+    # broker 连接池大小，投递任务时复用连接而不是每次新建
+    CELERY_BROKER_POOL_LIMIT: int = 50
+    # 结果后端 Redis 连接池大小
+    CELERY_REDIS_MAX_CONNECTIONS: int = 50
 
     @field_validator("CELERY_BROKER_URL", mode='before')
     def set_celery_broker(cls, v: Optional[str], info: ValidationInfo) -> str:
@@ -136,6 +166,14 @@ class Settings(BaseSettings):
     CHROMADB_MAX_RETRIES: int = 5
     CHROMADB_RETRY_DELAY: int = 3
 
+    # ChromaDB HNSW 索引参数（仅在创建 Collection 时生效）
+    # 检索为主的场景下使用更大的 M 和 ef，以构建开销换取更低的查询延迟和更高的召回；
+    # 十万级以上的大集合可将 M 提高到 64，进一步减少查询跳数，但索引内存约翻倍
+    CHROMADB_HNSW_SPACE: str = "l2"
+    CHROMADB_HNSW_M: int = 32
+    CHROMADB_HNSW_CONSTRUCTION_EF: int = 200
+    CHROMADB_HNSW_SEARCH_EF: int = 64
+
     # --- LLM 和 Embedding 模型 API Keys ---
     OPENAI_API_KEY: Optional[str] = None
     AZURE_OPENAI_API_KEY: Optional[str] = None
@@ -154,6 +192,15 @@ class Settings(BaseSettings):
 
     # --- 索引和嵌入配置（默认） ---
     EMBEDDING_BATCH_SIZE: int = 32
+    # Embedding 向量持久化缓存（SQLite），相同文本和模型的向量只请求一次
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "./data/embedding_cache.db"
+    # 持久化缓存最多保留的条目数（0 表示不限制），超出后淘汰最久未访问的条目；1536 维向量约占 6KB/条
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+    # 进程内 LRU 向量缓存的条目数（0 表示不启用），1536 维向量约占 6KB/条
+    EMBEDDING_MEMORY_CACHE_SIZE: int = 4096
+    # 进程内 LRU 问题向量缓存的条目数（0 表示不启用），重复提问时不再调用 Embedding API
+    EMBEDDING_QUERY_CACHE_SIZE: int = 1024
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
 
@@ -174,23 +221,21 @@ class Settings(BaseSettings):
         
         # 如果是字符串，尝试解析JSON数组或逗号分隔
         if isinstance(v, str):
-            v = v.strip()
-            
-            # 尝试解析JSON数组格式
-            if v.startswith('[') and v.endswith(']'):
-                try:
-                    parsed = json.loads(v)
-                    if isinstance(parsed, list):
-                        return [str(item).strip() for item in parsed if item]
-                except json.JSONDecodeError:
-                    pass
-            
-            # 否则按逗号分隔处理
-            return [item.strip() for item in v.split(',') if item.strip()]
+            return _parse_list_value(v.strip())
         
         # 其他类型转换为字符串后处理
         return [str(v).strip()] if v else []
 
+    @cached_property
+    def allowed_file_extensions_set(self) -> FrozenSet[str]:
+        """允许处理的文件扩展名集合，用于 O(1) 的扩展名检查"""
+        return frozenset(self.ALLOWED_FILE_EXTENSIONS)
+
+    @cached_property
+    def excluded_directories_set(self) -> FrozenSet[str]:
+        """排除的目录名集合"""
+        return frozenset(self.EXCLUDED_DIRECTORIES)
+
     #---混合检索返回的文件个数---
     FINAL_CONTEXT_TOP_K: int = 10
 
@@ -206,8 +251,19 @@ class Settings(BaseSettings):
         'go', 'rust'
     ]
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    获取全局配置实例
+
+    只在首次调用时构建 Settings 并运行所有校验器，之后直接返回缓存的实例，
+    可用于 FastAPI 依赖注入：settings: Settings = Depends(get_settings)
+    """
+    return Settings()
+
+
 # 全局配置实例
-settings = Settings()
+settings = get_settings()
 
 
 # 日志设置
@@ -254,6 +310,9 @@ def validate_config():
     # 验证批处理大小
     if settings.EMBEDDING_BATCH_SIZE <= 0:
         errors.append("EMBEDDING_BATCH_SIZE 必须大于 0")
+
+    if settings.EMBEDDING_CACHE_MAX_ENTRIES < 0:
+        errors.append("EMBEDDING_CACHE_MAX_ENTRIES 不能为负数")
     
     if settings.CHUNK_SIZE <= 0:
         errors.append("CHUNK_SIZE 必须大于 0")
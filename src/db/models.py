@@ -5,12 +5,27 @@
 
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Dict, Any
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Enum as SQLEnum
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.sql import func
+from typing import Optional, Dict, Any, List
+from sqlalchemy import Integer, String, DateTime, Text, JSON, Index, case, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.sql import func, text
 
-Base = declarative_base()
+
+class Base(DeclarativeBase):
+    """ORM 模型基类"""
+    pass
+
+
+# PostgreSQL 上使用二进制存储的 JSONB（键查找无需重新解析文本，并支持 GIN 索引），其他数据库回退到通用 JSON
+# none_as_null：Python 的 None 一律存为 SQL NULL，与 COPY 写入的结果一致，而不是 JSON 的 'null'
+JSONType = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True, astext_type=Text()), "postgresql")
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    """将时间戳格式化为 ISO 8601 字符串，空值返回 None"""
+    return value.isoformat() if value is not None else None
 
 
 class TaskStatus(str, Enum):
@@ -26,51 +41,119 @@ class TaskStatus(str, Enum):
 class AnalysisSession(Base):
     """分析会话模型"""
     __tablename__ = "analysis_sessions"
-
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(64), unique=True, index=True, nullable=False)
-    task_id = Column(String(64), nullable=True, index=True)  # Celery 任务 ID
-    repository_url = Column(String(512), nullable=False)
-    repository_name = Column(String(256), nullable=True)
-    repository_owner = Column(String(128), nullable=True)
-    repository_identifier = Column(String(128), nullable=True, index=True)  # 新增：仓库唯一标识符
+    __table_args__ = (
+        Index(
+            "ix_analysis_sessions_embedding_config_gin",
+            "embedding_config",
+            postgresql_using="gin",
+            postgresql_ops={"embedding_config": "jsonb_path_ops"}
+        ).ddl_if(dialect="postgresql"),
+        # GIN 索引不能加速 ->> 取值，按提供商分组/过滤的统计查询使用 B-tree 表达式索引
+        Index(
+            "ix_session_emb_provider",
+            text("(embedding_config ->> 'provider')"),
+            postgresql_where=text("embedding_config IS NOT NULL")
+        ).ddl_if(dialect="postgresql"),
+        # 只索引未结束的会话，查找待处理任务时不必扫描大量已结束的记录
+        Index(
+            "ix_sessions_status_pending",
+            "status",
+            postgresql_where=text("status IN ('pending', 'processing')")
+        ).ddl_if(dialect="postgresql"),
+        # session_id 唯一索引，INCLUDE 状态响应用到的列，按 session_id 查询状态时可走 Index Only Scan；
+        # 已有数据库由 scripts/add_session_status_covering_index.py 迁移
+        Index(
+            "ix_analysis_sessions_session_id_covering",
+            "session_id",
+            unique=True,
+            postgresql_include=[
+                "status", "task_id", "repository_url", "repository_name", "repository_owner",
+                "total_files", "processed_files", "total_chunks", "indexed_chunks",
+                "created_at", "started_at", "completed_at",
+            ]
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    task_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)  # Celery 任务 ID
+    repository_url: Mapped[str] = mapped_column(String(512), nullable=False)
+    repository_name: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
+    repository_owner: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    repository_identifier: Mapped[Optional[str]] = mapped_column(String(128), nullable=True, index=True)  # 新增：仓库唯一标识符
 
     # 任务状态
-    status = Column(SQLEnum(TaskStatus), default=TaskStatus.PENDING, nullable=False)
-    error_message = Column(Text, nullable=True)
+    # 以 VARCHAR + CHECK 约束存储枚举值而不是 PostgreSQL 原生 ENUM 类型，新增状态时无需 ALTER TYPE；
+    # Python 侧读写仍然是 TaskStatus
+    status: Mapped[TaskStatus] = mapped_column(
+        SQLEnum(
+            TaskStatus,
+            native_enum=False,
+            create_constraint=True,
+            length=16,
+            name="ck_sessions_status",
+            values_callable=lambda enum_cls: [member.value for member in enum_cls]
+        ),
+        default=TaskStatus.PENDING,
+        nullable=False
+    )
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # 处理统计
-    total_files = Column(Integer, default=0)
-    processed_files = Column(Integer, default=0)
-    total_chunks = Column(Integer, default=0)
-    indexed_chunks = Column(Integer, default=0)
+    total_files: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    processed_files: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    total_chunks: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    indexed_chunks: Mapped[Optional[int]] = mapped_column(Integer, default=0)
 
     # 模型配置
-    embedding_config = Column(JSON, nullable=True)
+    embedding_config: Mapped[Any] = mapped_column(JSONType, nullable=True)
 
     # 时间戳
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    started_at = Column(DateTime(timezone=True), nullable=True)
-    completed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # 会话下的文件元数据（按 session_id 关联，数据库中不建外键）；
+    # 禁止隐式懒加载，需要时通过 selectinload(AnalysisSession.files) 一次性加载，避免 N+1 查询；
+    # 只读关系，删除会话时不会级联或把 file_metadata.session_id 置空
+    files: Mapped[List["FileMetadata"]] = relationship(
+        back_populates="session",
+        primaryjoin="AnalysisSession.session_id == foreign(FileMetadata.session_id)",
+        lazy="raise",
+        viewonly=True
+    )
 
     def __repr__(self):
         return f"<AnalysisSession(session_id={self.session_id}, status={self.status})>"
 
-    @property
+    @hybrid_property
     def processing_duration(self) -> Optional[float]:
         """计算处理时长（秒）"""
         if self.started_at and self.completed_at:
             return (self.completed_at - self.started_at).total_seconds()
         return None
 
-    @property
+    @processing_duration.expression
+    def processing_duration(cls):
+        """处理时长的 SQL 表达式，任一时间戳为空时结果为 NULL"""
+        return func.extract("epoch", cls.completed_at - cls.started_at)
+
+    @hybrid_property
     def progress_percentage(self) -> float:
         """计算处理进度百分比"""
         if self.total_chunks == 0:
             return 0.0
         return (self.indexed_chunks / self.total_chunks) * 100
 
+    @progress_percentage.expression
+    def progress_percentage(cls):
+        """处理进度百分比的 SQL 表达式，可直接在查询中选取或过滤"""
+        return case(
+            (func.coalesce(cls.total_chunks, 0) == 0, 0.0),
+            else_=cls.indexed_chunks * 100.0 / cls.total_chunks
+        )
+
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
         return {
@@ -87,10 +170,10 @@ class AnalysisSession(Base):
             "indexed_chunks": self.indexed_chunks,
             "progress_percentage": self.progress_percentage,
             "embedding_config": self.embedding_config,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            "started_at": self.started_at.isoformat() if self.started_at else None,
-            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "created_at": _iso(self.created_at),
+            "updated_at": _iso(self.updated_at),
+            "started_at": _iso(self.started_at),
+            "completed_at": _iso(self.completed_at),
             "processing_duration": self.processing_duration
         }
 
@@ -99,30 +182,30 @@ class Repository(Base):
     """仓库持久性模型 - 跟踪仓库的向量数据库Collection信息"""
     __tablename__ = "repositories"
 
-    id = Column(Integer, primary_key=True, index=True)
-    repository_identifier = Column(String(128), unique=True, index=True, nullable=False)  # 仓库唯一标识符
-    repository_url = Column(String(512), nullable=False, index=True)
-    repository_name = Column(String(256), nullable=False)
-    repository_owner = Column(String(128), nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    repository_identifier: Mapped[str] = mapped_column(String(128), unique=True, index=True, nullable=False)  # 仓库唯一标识符
+    repository_url: Mapped[str] = mapped_column(String(512), nullable=False, index=True)
+    repository_name: Mapped[str] = mapped_column(String(256), nullable=False)
+    repository_owner: Mapped[str] = mapped_column(String(128), nullable=False)
     
     # Collection 信息
-    collection_name = Column(String(128), nullable=False)  # ChromaDB Collection 名称
+    collection_name: Mapped[str] = mapped_column(String(128), nullable=False)  # ChromaDB Collection 名称
     
     # 统计信息
-    total_files = Column(Integer, default=0)
-    total_chunks = Column(Integer, default=0)
-    last_analysis_session_id = Column(String(64), nullable=True)  # 最后一次分析的会话ID
+    total_files: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    total_chunks: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    last_analysis_session_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # 最后一次分析的会话ID
     
     # 版本信息
-    last_commit_hash = Column(String(64), nullable=True)  # 最后处理的提交哈希
+    last_commit_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)  # 最后处理的提交哈希
     
     # 配置信息
-    embedding_config = Column(JSON, nullable=True)  # 最后使用的Embedding配置
+    embedding_config: Mapped[Any] = mapped_column(JSONType, nullable=True)  # 最后使用的Embedding配置
     
     # 时间戳
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    last_analyzed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
+    last_analyzed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     def __repr__(self):
         return f"<Repository(identifier={self.repository_identifier}, url={self.repository_url})>"
@@ -140,38 +223,57 @@ class Repository(Base):
             "last_analysis_session_id": self.last_analysis_session_id,
             "last_commit_hash": self.last_commit_hash,
             "embedding_config": self.embedding_config,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-            "last_analyzed_at": self.last_analyzed_at.isoformat() if self.last_analyzed_at else None,
+            "created_at": _iso(self.created_at),
+            "updated_at": _iso(self.updated_at),
+            "last_analyzed_at": _iso(self.last_analyzed_at),
         }
 
 
 class QueryLog(Base):
     """查询日志模型"""
     __tablename__ = "query_logs"
-
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(64), index=True, nullable=False)
-    question = Column(Text, nullable=False)
-    answer = Column(Text, nullable=True)
+    __table_args__ = (
+        Index(
+            "ix_querylog_llm_config_gin",
+            "llm_config",
+            postgresql_using="gin",
+            postgresql_ops={"llm_config": "jsonb_path_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_querylog_llm_model_name",
+            text("(llm_config ->> 'model_name')"),
+            postgresql_where=text("llm_config IS NOT NULL")
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_querylog_llm_provider",
+            text("(llm_config ->> 'provider')"),
+            postgresql_where=text("llm_config IS NOT NULL")
+        ).ddl_if(dialect="postgresql"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_id: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
+    question: Mapped[str] = mapped_column(Text, nullable=False)
+    answer: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # 检索信息
-    retrieved_chunks_count = Column(Integer, default=0)
-    vector_search_results = Column(JSON, nullable=True)
-    bm25_search_results = Column(JSON, nullable=True)
-    final_context = Column(JSON, nullable=True)
+    # 检索结果体积较大且很少读取，默认延迟加载，需要时通过 undefer() 显式加载
+    retrieved_chunks_count: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    vector_search_results: Mapped[Any] = mapped_column(JSONType, nullable=True, deferred=True)
+    bm25_search_results: Mapped[Any] = mapped_column(JSONType, nullable=True, deferred=True)
+    final_context: Mapped[Any] = mapped_column(JSONType, nullable=True, deferred=True)
 
     # 生成配置
-    generation_mode = Column(String(32), default="service")  # service 或 plugin
-    llm_config = Column(JSON, nullable=True)
+    generation_mode: Mapped[Optional[str]] = mapped_column(String(32), default="service")  # service 或 plugin
+    llm_config: Mapped[Any] = mapped_column(JSONType, nullable=True)
 
     # 性能指标
-    retrieval_time = Column(Integer, nullable=True)  # 毫秒
-    generation_time = Column(Integer, nullable=True)  # 毫秒
-    total_time = Column(Integer, nullable=True)  # 毫秒
+    retrieval_time: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # 毫秒
+    generation_time: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # 毫秒
+    total_time: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # 毫秒
 
     # 时间戳
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     def __repr__(self):
         return f"<QueryLog(session_id={self.session_id}, question={self.question[:50]}...)>"
@@ -189,35 +291,51 @@ class QueryLog(Base):
             "retrieval_time": self.retrieval_time,
             "generation_time": self.generation_time,
             "total_time": self.total_time,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "created_at": _iso(self.created_at)
         }
 
 
 class FileMetadata(Base):
     """文件元数据模型"""
     __tablename__ = "file_metadata"
-
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(64), index=True, nullable=False)
-    file_path = Column(String(1024), nullable=False)
-    file_type = Column(String(32), nullable=False)  # code, document, config, etc.
-    file_extension = Column(String(16), nullable=True)
-    file_size = Column(Integer, nullable=False)  # bytes
-    line_count = Column(Integer, nullable=True)
+    __table_args__ = (
+        # 按会话统计已处理文件数和分块数时可以只读索引；以 session_id 开头，同时覆盖按会话的查询
+        Index(
+            "ix_filemeta_session_status",
+            "session_id",
+            "is_processed",
+            postgresql_include=["chunk_count"]
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    file_path: Mapped[str] = mapped_column(String(1024), nullable=False)
+    file_type: Mapped[str] = mapped_column(String(32), nullable=False)  # code, document, config, etc.
+    file_extension: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    file_size: Mapped[int] = mapped_column(Integer, nullable=False)  # bytes
+    line_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     # 内容摘要
-    content_summary = Column(Text, nullable=True)
-    key_symbols = Column(JSON, nullable=True)  # 函数名、类名等
-    dependencies = Column(JSON, nullable=True)  # 依赖信息
+    content_summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    key_symbols: Mapped[Any] = mapped_column(JSONType, nullable=True)  # 函数名、类名等
+    dependencies: Mapped[Any] = mapped_column(JSONType, nullable=True)  # 依赖信息
 
     # 处理状态
-    is_processed = Column(String(16), default="pending")  # pending, success, failed, skipped
-    chunk_count = Column(Integer, default=0)
-    error_message = Column(Text, nullable=True)
+    is_processed: Mapped[Optional[str]] = mapped_column(String(16), default="pending")  # pending, success, failed, skipped
+    chunk_count: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # 时间戳
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    processed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    processed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    session: Mapped[Optional["AnalysisSession"]] = relationship(
+        back_populates="files",
+        primaryjoin="AnalysisSession.session_id == foreign(FileMetadata.session_id)",
+        lazy="raise",
+        viewonly=True
+    )
 
     def __repr__(self):
         return f"<FileMetadata(file_path={self.file_path}, is_processed={self.is_processed})>"
@@ -238,6 +356,6 @@ class FileMetadata(Base):
             "is_processed": self.is_processed,
             "chunk_count": self.chunk_count,
             "error_message": self.error_message,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "processed_at": self.processed_at.isoformat() if self.processed_at else None
+            "created_at": _iso(self.created_at),
+            "processed_at": _iso(self.processed_at)
         }
\ No newline at end of file
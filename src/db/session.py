@@ -3,30 +3,159 @@
 负责创建和管理数据库连接和会话
 """
 
-from typing import Generator
-from sqlalchemy import create_engine
+import io
+import json
+from functools import lru_cache
+from typing import Generator, AsyncIterator, Iterator, List, Dict, Any
+from sqlalchemy import create_engine, insert, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import make_url, Engine, URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, QueuePool
 
 from ..core.config import settings
-from .models import Base
+from .models import Base, AnalysisSession, FileMetadata, QueryLog
 
 
-# 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    # SQLite 特殊配置
-    poolclass=StaticPool if settings.DATABASE_URL.startswith("sqlite") else None,
-    connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
+_IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+
+# 连接池配置：SQLite 使用 StaticPool，其余数据库使用带 pre_ping 的 QueuePool
+_POOL_KWARGS = {
+    "poolclass": StaticPool,
+    "connect_args": {"check_same_thread": False},
+} if _IS_SQLITE else {
+    "poolclass": QueuePool,
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": True,
+}
+
+# 批量写入配置：多行 INSERT 按页合并为一条 VALUES 语句；
+# psycopg2 下 UPDATE/DELETE 的 executemany 也改用 execute_batch 分批发送
+_EXECUTEMANY_KWARGS = {} if _IS_SQLITE else {"insertmanyvalues_page_size": 1000}
+if make_url(settings.DATABASE_URL).get_driver_name() == "psycopg2":
+    _EXECUTEMANY_KWARGS.update(
+        executemany_mode="values_plus_batch",
+        executemany_batch_page_size=500
+    )
+
+@lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    """
+    获取同步数据库引擎（Celery 任务和脚本使用）
+    首次调用时才创建，导入本模块不会建立连接池；Worker 子进程也不会继承父进程创建的连接池
+    """
+    return create_engine(
+        settings.DATABASE_URL,
+        echo=settings.DEBUG,
+        **_POOL_KWARGS,
+        **_EXECUTEMANY_KWARGS
+    )
+
+
+def dispose_engine(close: bool = True) -> None:
+    """
+    释放同步引擎的连接池（引擎尚未创建时不做任何事）
+
+    Args:
+        close: 是否关闭池中的连接；fork 出的子进程中应传 False，只丢弃继承的连接而不关闭父进程仍在使用的 socket
+    """
+    if get_engine.cache_info().currsize:
+        get_engine().dispose(close=close)
+
+
+# 创建会话工厂（创建会话时再绑定引擎）
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def _build_async_url(database_url: str) -> URL:
+    """将同步数据库 URL 转换为对应的异步驱动 URL（PostgreSQL 使用 asyncpg）"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+@lru_cache(maxsize=1)
+def get_async_engine() -> AsyncEngine:
+    """
+    获取异步数据库引擎（供 FastAPI 接口使用，Celery 任务继续使用同步引擎）
+    首次调用时才创建，Worker 和脚本导入本模块时不需要安装异步驱动；
+    连接池在请求之间复用连接，pre_ping 用于剔除数据库重启后失效的连接
+    """
+    return create_async_engine(
+        _build_async_url(settings.DATABASE_URL),
+        echo=settings.DEBUG,
+        **({} if _IS_SQLITE else {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        })
+    )
+
+
+async def dispose_async_engine() -> None:
+    """释放异步引擎的连接池（引擎尚未创建时不做任何事）"""
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+
+
+# 创建异步会话工厂（创建会话时再绑定引擎）
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    expire_on_commit=False
 )
 
-# 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _check_session_status_column(engine: Engine) -> None:
+    """
+    检查 analysis_sessions.status 是否仍是旧版本创建的 PostgreSQL 原生 ENUM
+
+    模型现在以 VARCHAR + CHECK 约束存储枚举值（如 pending），旧 ENUM 只接受成员名（如 PENDING），
+    不迁移就启动会在第一次写入状态时失败，因此在启动阶段直接报错
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    with engine.connect() as conn:
+        data_type = conn.execute(text("""
+            SELECT data_type
+            FROM information_schema.columns
+            WHERE table_schema = current_schema()
+            AND table_name = 'analysis_sessions'
+            AND column_name = 'status'
+        """)).scalar()
+
+    if data_type == "USER-DEFINED":
+        raise RuntimeError(
+            "analysis_sessions.status 仍是旧版本的 PostgreSQL ENUM 类型，"
+            "请先运行 python scripts/convert_session_status_to_varchar.py 完成迁移"
+            "（完整步骤见 README 的“升级已有数据库”一节）"
+        )
 
 
 def create_tables():
-    """创建所有数据库表"""
+    """
+    创建缺失的数据库表
+    先用一次查询列出已有的表，表都已存在时直接返回，不再让 create_all 逐表检查；
+    已有表的结构变更由 scripts/ 下的迁移脚本负责，未迁移的不兼容结构会在这里报错
+
+    Raises:
+        RuntimeError: analysis_sessions.status 尚未从 ENUM 迁移为 VARCHAR
+    """
+    engine = get_engine()
+    existing_tables = set(inspect(engine).get_table_names())
+    if AnalysisSession.__tablename__ in existing_tables:
+        _check_session_status_column(engine)
+    if set(Base.metadata.tables).issubset(existing_tables):
+        return
+
     Base.metadata.create_all(bind=engine)
 
 
@@ -35,7 +164,7 @@ def get_db() -> Generator[Session, None, None]:
     获取数据库会话的依赖项
     用于 FastAPI 的依赖注入
     """
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
@@ -43,9 +172,117 @@ def get_db() -> Generator[Session, None, None]:
             db.close()
 
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    获取异步数据库会话的依赖项
+    用于 FastAPI 的依赖注入，请求结束后自动归还连接
+    """
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        yield db
+
+
 def get_db_session() -> Session:
     """
     直接获取数据库会话
     用于非 FastAPI 环境（如 Celery 任务）
     """
-    return SessionLocal()
\ No newline at end of file
+    return SessionLocal(bind=get_engine())
+
+
+def bulk_create_sessions(rows: List[Dict[str, Any]]) -> None:
+    """
+    批量创建分析会话记录
+    所有记录通过一条 executemany INSERT 写入；PostgreSQL 下 session_id 已存在的记录会被跳过，
+    重复提交同一批数据不会报错
+
+    Args:
+        rows: 会话记录字段字典列表，至少包含 session_id 和 repository_url
+    """
+    if not rows:
+        return
+
+    if get_engine().dialect.name == "postgresql":
+        stmt = pg_insert(AnalysisSession).on_conflict_do_nothing(index_elements=["session_id"])
+    else:
+        stmt = insert(AnalysisSession)
+
+    with SessionLocal(bind=get_engine()) as db:
+        db.execute(stmt, rows)
+        db.commit()
+
+
+# 行数达到该值时才使用 COPY，行数太少时 COPY 的额外开销不划算（入库流程每批 50 条）
+COPY_MIN_ROWS = 50
+
+
+def _copy_text_value(value: Any) -> str:
+    """将值编码为 PostgreSQL COPY text 格式的字段"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def bulk_copy_file_metadata(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    批量写入文件元数据
+    PostgreSQL (psycopg2) 且行数足够多时使用 COPY FROM STDIN，否则回退到 executemany INSERT；
+    在调用方的事务中执行，由调用方负责提交
+
+    Args:
+        db: 数据库会话
+        rows: 文件元数据字段字典列表，所有字典的键相同
+    """
+    if not rows:
+        return
+
+    if len(rows) < COPY_MIN_ROWS or db.get_bind().dialect.driver != "psycopg2":
+        db.execute(insert(FileMetadata), rows)
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text_value(row[column]) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {FileMetadata.__tablename__} ({', '.join(columns)}) FROM STDIN",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def stream_query_logs(db: Session, session_id: str, chunk_size: int = 500) -> Iterator[QueryLog]:
+    """
+    按创建顺序逐条迭代会话的查询日志
+    使用服务端游标分批拉取，每次只在内存中保留 chunk_size 条记录，适合导出或统计大量历史日志
+
+    Args:
+        db: 数据库会话，迭代期间需保持打开
+        session_id: 会话ID
+        chunk_size: 每批拉取的记录数
+
+    Yields:
+        QueryLog: 查询日志记录
+    """
+    stmt = (
+        select(QueryLog)
+        .where(QueryLog.session_id == session_id)
+        .order_by(QueryLog.id)
+        .execution_options(yield_per=chunk_size, stream_results=True)
+    )
+    yield from db.scalars(stmt)
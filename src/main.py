@@ -3,14 +3,22 @@ GitHub Bot 主应用入口
 FastAPI 应用实例，聚合所有 API 路由
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+import asyncio
 import logging
+import os
+import time
 from datetime import datetime
+from typing import Dict, Any
+
+import anyio.to_thread
 
 from .core.config import settings, setup_logging, validate_config
 from .api.v1.api import api_router
-from .db.session import create_tables
+from .db.session import create_tables, dispose_async_engine, get_async_engine
 
 # 配置日志
 setup_logging()
@@ -22,7 +30,9 @@ app = FastAPI(
     description="智能分析 GitHub 仓库并提供问答服务",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # 使用 orjson 序列化所有 JSON 响应
+    default_response_class=ORJSONResponse
 )
 
 # 配置 CORS
@@ -35,6 +45,26 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    """
+    兜底异常处理
+    接口内未处理的异常统一记录日志并返回 500，HTTPException 仍由 FastAPI 默认处理
+
+    Exception 处理器由最外层的 ServerErrorMiddleware 调用，响应不会经过 CORSMiddleware，
+    需要按 CORS 配置补上响应头，否则浏览器只能看到跨域失败而拿不到错误信息
+    """
+    logger.exception("💥 [API错误] 请求处理失败 - %s %s: %s", request.method, request.url.path, exc)
+    response = ORJSONResponse(status_code=500, content={"detail": str(exc)})
+    origin = request.headers.get("origin")
+    if origin:
+        # 与 CORSMiddleware 在 allow_origins=["*"] 且 allow_credentials=True 时的行为一致：回显请求来源
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers["Vary"] = "Origin"
+    return response
+
+
 @app.on_event("startup")
 async def startup_event():
     """应用启动事件"""
@@ -43,6 +73,11 @@ async def startup_event():
     # 验证配置
     validate_config()
     
+    # 扩大 anyio 默认线程池（默认 40），Celery 投递和健康检查等同步调用都在线程池中执行
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(limiter.total_tokens, min(100, 4 * (os.cpu_count() or 1)))
+    logger.info(f"线程池大小: {limiter.total_tokens}")
+    
     # 创建数据库表
     try:
         create_tables()
@@ -58,6 +93,9 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭事件"""
     logger.info("GitHub Bot API 服务正在关闭...")
+    
+    # 释放异步数据库连接池
+    await dispose_async_engine()
 
 
 # 注册路由
@@ -72,51 +110,96 @@ async def root():
         "docs": "/docs"
     }
 
-@app.get("/health")
-async def health_check():
-    """健康检查"""
-    from .db.session import get_db_session
+
+async def _probe_database() -> None:
+    """数据库连接探测（直接从异步连接池取连接，不创建 ORM 会话，也不占用线程池）"""
+    from sqlalchemy import text
+
+    async with get_async_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def _probe_redis() -> None:
+    """Redis 连接探测（直接 PING，不再通过 Celery 向所有 Worker 广播 inspect）"""
+    from .services.session_cache import get_async_redis_client
+
+    await get_async_redis_client().ping()
+
+
+async def _probe_chromadb() -> None:
+    """ChromaDB 连接探测（同步客户端放到线程池执行，避免阻塞事件循环）"""
     from .services.vector_store import get_vector_store
-    
+
+    result = await run_in_threadpool(lambda: get_vector_store().health_check())
+    if result.get("status") != "healthy":
+        raise RuntimeError(result.get("error", "unknown error"))
+
+
+# (检查项名称, 探测函数, 失败时的整体状态)
+_HEALTH_PROBES = (
+    ("database", _probe_database, "unhealthy"),
+    ("redis", _probe_redis, "degraded"),
+    ("chromadb", _probe_chromadb, "degraded"),
+)
+
+# 健康检查结果的进程内缓存，由锁保证同一时刻只有一个请求在探测
+_health_cache: Dict[str, Any] = {"ts": 0.0, "data": None}
+_health_lock = asyncio.Lock()
+
+
+def _health_cache_fresh() -> bool:
+    """缓存的健康检查结果是否仍在有效期内"""
+    return (
+        _health_cache["data"] is not None
+        and time.monotonic() - _health_cache["ts"] < settings.HEALTH_CHECK_CACHE_TTL
+    )
+
+
+async def _run_health_probes() -> Dict[str, Any]:
+    """并发执行所有后端探测，每个探测单独限时"""
+    results = await asyncio.gather(
+        *(asyncio.wait_for(probe(), timeout=settings.HEALTH_CHECK_TIMEOUT) for _, probe, _ in _HEALTH_PROBES),
+        return_exceptions=True
+    )
+
     health_status = {
         "status": "healthy",
         "service": "github-bot",
         "version": "1.0.0",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": datetime.now(),  # orjson 直接序列化 datetime
         "checks": {}
     }
-    
-    # 数据库连接检查
-    try:
-        from sqlalchemy import text
-        db = get_db_session()
-        db.execute(text("SELECT 1"))
-        db.close()
-        health_status["checks"]["database"] = "healthy"
-    except Exception as e:
-        health_status["checks"]["database"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "unhealthy"
-    
-    # Redis 连接检查（间接通过 Celery）
-    try:
-        from .worker.celery_app import celery_app
-        inspect = celery_app.control.inspect()
-        inspect.stats()
-        health_status["checks"]["redis"] = "healthy"
-    except Exception as e:
-        health_status["checks"]["redis"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "degraded"
-    
-    # ChromaDB 连接检查
-    try:
-        get_vector_store().health_check()
-        health_status["checks"]["chromadb"] = "healthy"
-    except Exception as e:
-        health_status["checks"]["chromadb"] = f"unhealthy: {str(e)}"
-        health_status["status"] = "degraded"
-    
+
+    for (name, _, failed_status), result in zip(_HEALTH_PROBES, results):
+        if isinstance(result, asyncio.TimeoutError):
+            health_status["checks"][name] = f"unhealthy: timeout after {settings.HEALTH_CHECK_TIMEOUT}s"
+        elif isinstance(result, Exception):
+            health_status["checks"][name] = f"unhealthy: {str(result)}"
+        else:
+            health_status["checks"][name] = "healthy"
+            continue
+
+        # unhealthy 优先于 degraded
+        if health_status["status"] != "unhealthy":
+            health_status["status"] = failed_status
+
     return health_status
 
+
+@app.get("/health")
+async def health_check():
+    """健康检查"""
+    if _health_cache_fresh():
+        return _health_cache["data"]
+
+    async with _health_lock:
+        # 等待锁期间其他请求可能已经刷新了缓存
+        if not _health_cache_fresh():
+            _health_cache["data"] = await _run_health_probes()
+            _health_cache["ts"] = time.monotonic()
+
+    return _health_cache["data"]
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
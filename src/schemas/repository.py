@@ -3,8 +3,9 @@
 定义 API 请求和响应的数据结构
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, Any, List
+from datetime import datetime
 from enum import Enum
 
 class EmbeddingProvider(str, Enum):
@@ -40,8 +41,11 @@ class TaskStatus(str, Enum):
     SUCCESS = "success"
     FAILED = "failed"
     CANCELLED = "cancelled"
+    PARTIAL_SUCCESS = "partial_success"
 
 class EmbeddingConfig(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     provider: EmbeddingProvider
     model_name: str
     api_key: str | None = None
@@ -51,6 +55,8 @@ class EmbeddingConfig(BaseModel):
     extra_params: Dict[str, Any] | None = None
 
 class LLMConfig(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     provider: LLMProvider
     model_name: str
     api_key: str | None = None
@@ -67,27 +73,32 @@ class RepoAnalyzeRequest(BaseModel):
 
 class RepoAnalyzeResponse(BaseModel):
     """仓库分析响应模型"""
+    model_config = ConfigDict(use_enum_values=True)
+
     session_id: str
     message: str
     status: TaskStatus = TaskStatus.PENDING
 
-    class Config:
-        use_enum_values = True
-
 class QueryRequest(BaseModel):
     session_id: str
     question: str
     generation_mode: str
     llm_config: LLMConfig | None = None
 
+class BatchQueryStatusRequest(BaseModel):
+    """批量查询任务状态请求"""
+    session_ids: List[str] = Field(..., min_length=1, max_length=100)
+
 class RetrievedChunk(BaseModel):
     """检索到的文档块"""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
     id: str
     content: str
     file_path: str
     start_line: Optional[int] = None
     score: float
-    metadata: Optional[Dict[str, Any]] = {}
+    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
 
 class QueryResponse(BaseModel):
     answer: str | None = None
@@ -98,27 +109,22 @@ class QueryResponse(BaseModel):
     total_time: int | None = None
 
 class SessionStatusResponse(BaseModel):
-    """会话状态响应模型"""
+    """会话状态响应模型（可直接从 AnalysisSession ORM 对象构建）"""
+    model_config = ConfigDict(from_attributes=True, use_enum_values=True)
+
     session_id: str
+    status: TaskStatus
     repository_url: str
     repository_name: Optional[str] = None
     repository_owner: Optional[str] = None
-    status: TaskStatus
+    total_files: Optional[int] = 0
+    processed_files: Optional[int] = 0
+    total_chunks: Optional[int] = 0
+    indexed_chunks: Optional[int] = 0
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
-    total_files: int = 0
-    processed_files: int = 0
-    total_chunks: int = 0
-    indexed_chunks: int = 0
-    progress_percentage: float = 0.0
-    embedding_config: Optional[Dict[str, Any]] = None
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
-    started_at: Optional[str] = None
-    completed_at: Optional[str] = None
-    processing_duration: Optional[float] = None
-
-    class Config:
-        use_enum_values = True
 
 class ErrorResponse(BaseModel):
     """错误响应模型"""
@@ -131,7 +137,7 @@ class HealthResponse(BaseModel):
     status: str = "healthy"
     version: str
     timestamp: str
-    services: Dict[str, str] = {}
+    services: Dict[str, str] = Field(default_factory=dict)
 
 class FileInfo(BaseModel):
     """文件信息模型"""
@@ -0,0 +1,246 @@
+"""
+Embedding 向量持久化缓存
+以 (提供商, 模型, 文本 SHA-256) 为键把向量保存在本地 SQLite 中，
+重复索引相同内容时直接复用已有向量，不再调用 Embedding API；
+条目数超过上限时按最近访问时间淘汰最旧的条目
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# SQLite 单条语句的参数个数上限较低（旧版本为 999），IN 查询按该大小分批
+_SQLITE_MAX_PARAMS = 500
+# 命中时只在访问时间早于该间隔时才回写，避免每次读取都产生写事务
+_TOUCH_INTERVAL_SECONDS = 3600
+# 超出上限时一次淘汰到上限的 90%，避免每次写入都触发淘汰
+_EVICT_LOW_WATERMARK = 0.9
+
+
+class EmbeddingCache:
+    """基于 SQLite 的 Embedding 向量缓存（进程内线程安全）"""
+
+    def __init__(self, path: str, max_entries: int = 0):
+        """
+        Args:
+            path: SQLite 文件路径
+            max_entries: 最多保留的条目数，0 表示不限制
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL 模式下多个 Worker 进程可以同时读，写入不阻塞读取
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vec BLOB NOT NULL, accessed_at INTEGER NOT NULL DEFAULT 0"
+            ") WITHOUT ROWID"
+        )
+        # 早期版本创建的缓存文件没有 accessed_at 列，补上后旧条目视为最久未访问
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "accessed_at" not in columns:
+            try:
+                self._conn.execute("ALTER TABLE embeddings ADD COLUMN accessed_at INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError as e:
+                # 其他进程可能已经先一步补上了该列
+                if "duplicate column" not in str(e):
+                    raise
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embeddings_accessed_at ON embeddings (accessed_at)"
+        )
+
+    @staticmethod
+    def make_key(provider: str, model_name: str, text: str) -> bytes:
+        """
+        生成缓存键
+
+        Args:
+            provider: 提供商
+            model_name: 模型标识（需包含会影响向量维度的参数）
+            text: 原始文本
+
+        Returns:
+            bytes: SHA-256 摘要
+        """
+        return hashlib.sha256(f"{provider}\0{model_name}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, List[float]]:
+        """
+        批量读取向量
+
+        Args:
+            keys: 缓存键列表
+
+        Returns:
+            Dict[bytes, List[float]]: 命中的键到向量的映射
+        """
+        found: Dict[bytes, List[float]] = {}
+        stale: List[bytes] = []
+        now = int(time.time())
+        with self._lock:
+            for i in range(0, len(keys), _SQLITE_MAX_PARAMS):
+                chunk = keys[i:i + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vec, accessed_at FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, vec, accessed_at in rows:
+                    found[key] = array("f", vec).tolist()
+                    if accessed_at < now - _TOUCH_INTERVAL_SECONDS:
+                        stale.append(key)
+
+            if stale:
+                self._touch(stale, now)
+        return found
+
+    def _touch(self, keys: List[bytes], now: int) -> None:
+        """更新命中条目的访问时间（调用方需持有锁）"""
+        self._conn.execute("BEGIN")
+        try:
+            for i in range(0, len(keys), _SQLITE_MAX_PARAMS):
+                chunk = keys[i:i + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                self._conn.execute(
+                    f"UPDATE embeddings SET accessed_at = ? WHERE key IN ({placeholders})", [now, *chunk]
+                )
+            self._conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            # 访问时间只影响淘汰顺序，其他进程占用写锁时放弃本次更新即可
+            self._conn.execute("ROLLBACK")
+            logger.debug(f"⏭️ [向量缓存] 跳过访问时间更新: {str(e)}")
+
+    def put_many(self, items: Sequence[Tuple[bytes, List[float]]]) -> None:
+        """
+        批量写入向量（以 float32 存储）
+
+        Args:
+            items: (缓存键, 向量) 列表
+        """
+        if not items:
+            return
+        now = int(time.time())
+        rows = [(key, array("f", vec).tobytes(), now) for key, vec in items]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vec, accessed_at) VALUES (?, ?, ?)", rows
+                )
+                evicted = self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if evicted:
+            logger.info(f"🧹 [向量缓存] 条目数超过上限 {self.max_entries}，已淘汰 {evicted} 条最久未访问的向量")
+
+    def _evict(self) -> int:
+        """
+        条目数超过上限时删除最久未访问的条目（调用方需持有锁并处于事务中）
+
+        Returns:
+            int: 删除的条目数
+        """
+        if self.max_entries <= 0:
+            return 0
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return 0
+        excess = count - int(self.max_entries * _EVICT_LOW_WATERMARK)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)",
+            (excess,),
+        )
+        return excess
+
+
+class MemoryEmbeddingCache:
+    """
+    进程内 LRU 向量缓存，位于磁盘缓存之前
+    命中时不需要计算哈希也不需要查询 SQLite；向量以 float32 数组保存以控制内存占用
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, array]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[List[float]]:
+        """读取向量，命中时将其移到最近使用的位置"""
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return vec.tolist()
+
+    def put(self, key: Hashable, vec: List[float]) -> None:
+        """写入向量，超出容量时淘汰最久未使用的条目"""
+        if self.maxsize <= 0:
+            return
+        packed = array("f", vec)
+        with self._lock:
+            self._data[key] = packed
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中统计"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+# 进程内共享的内存缓存，供各次索引和查询复用
+memory_embedding_cache = MemoryEmbeddingCache(settings.EMBEDDING_MEMORY_CACHE_SIZE)
+# 问题向量单独缓存：部分模型对查询和文档使用不同的指令前缀，同一文本的两种向量不能混用
+query_embedding_cache = MemoryEmbeddingCache(settings.EMBEDDING_QUERY_CACHE_SIZE)
+
+# 全局缓存实例（延迟初始化）
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_failed = False
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """获取 Embedding 缓存实例，未启用或初始化失败时返回 None"""
+    global _embedding_cache, _embedding_cache_failed
+    if not settings.EMBEDDING_CACHE_ENABLED or _embedding_cache_failed:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None and not _embedding_cache_failed:
+                try:
+                    _embedding_cache = EmbeddingCache(
+                        settings.EMBEDDING_CACHE_PATH, max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+                    )
+                    logger.info(f"💾 [向量缓存] 已启用 Embedding 缓存: {settings.EMBEDDING_CACHE_PATH}")
+                except Exception as e:
+                    # 只尝试一次，避免每个批次都重复初始化和告警
+                    _embedding_cache_failed = True
+                    logger.warning(f"⚠️ [向量缓存] 初始化失败，将不使用缓存: {str(e)}")
+    return _embedding_cache
@@ -5,18 +5,29 @@ Embedding 模型管理器
 提供批量向量化、速率限制处理、异常重试等高级功能
 """
 
+import hashlib
+import importlib
 import logging
+import os
+import random
 import time
 import asyncio
-from typing import Dict, Any, Optional, List, Union
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Any, Optional, List, Tuple, Union
 from dataclasses import dataclass, field
-from langchain_openai import OpenAIEmbeddings, AzureOpenAIEmbeddings
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.embeddings import DashScopeEmbeddings
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import httpx
 from langchain_core.embeddings import Embeddings
 from ..core.config import settings
+from .embedding_cache import EmbeddingCache, get_embedding_cache, memory_embedding_cache, query_embedding_cache
+
+# 各提供商的 SDK 在对应的 _create_*_embeddings 中按需导入，
+# 避免仅使用一种提供商的进程也加载 torch / transformers 等重量级依赖
+if TYPE_CHECKING:
+    from langchain_openai import OpenAIEmbeddings, AzureOpenAIEmbeddings
+    from langchain_community.embeddings import HuggingFaceEmbeddings, OllamaEmbeddings
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
 logger = logging.getLogger(__name__)
 
 
@@ -30,8 +41,10 @@ class EmbeddingConfig:
     api_version: Optional[str] = None
     deployment_name: Optional[str] = None
     batch_size: int = 32
+    max_concurrent_requests: int = 4  # 同时在途的批次请求数
     max_retries: int = 3
     retry_delay: float = 1.0
+    retry_delay_max: float = 60.0  # 单次重试等待的上限（秒）
     timeout: int = 60
     extra_params: Dict[str, Any] = field(default_factory=dict)
 
@@ -79,13 +92,181 @@ class APIKeyError(EmbeddingError):
     pass
 
 
+def _try_import(path: str) -> Optional[type]:
+    """按 "模块.类名" 导入异常类型，对应的 SDK 未安装时返回 None"""
+    module_name, _, attr = path.rpartition(".")
+    try:
+        return getattr(importlib.import_module(module_name), attr)
+    except (ImportError, AttributeError):
+        return None
+
+
+def _import_types(*paths: str) -> Tuple[type, ...]:
+    """导入一组异常类型，跳过不可用的"""
+    return tuple(t for t in (_try_import(path) for path in paths) if t is not None)
+
+
+# 各 SDK 的速率限制和认证失败异常类型，按类型判断比匹配错误信息更可靠
+_RATE_LIMIT_ERROR_TYPES = _import_types(
+    "openai.RateLimitError",
+    "google.api_core.exceptions.ResourceExhausted",
+    "google.api_core.exceptions.TooManyRequests",
+)
+_API_KEY_ERROR_TYPES = _import_types(
+    "openai.AuthenticationError",
+    "google.api_core.exceptions.Unauthenticated",
+)
+# 这些 SDK 的异常类型已能准确区分错误原因，不再回退到错误信息匹配
+_TYPED_API_ERROR_TYPES = _import_types(
+    "openai.APIError",
+    "google.api_core.exceptions.GoogleAPIError",
+)
+
+_RATE_LIMIT_INDICATORS = ('rate limit', 'too many requests', 'quota exceeded', '429', 'rate_limit_exceeded')
+_API_KEY_INDICATORS = ('api key', 'invalid key', 'unauthorized', '401', 'authentication', 'invalid_api_key')
+
+
+def _matches_any(error: Exception, indicators: Tuple[str, ...]) -> bool:
+    """错误信息中是否包含任一关键字（不区分大小写）"""
+    error_str = str(error).lower()
+    return any(indicator in error_str for indicator in indicators)
+
+
+# 同步 Embedding 调用使用的专用线程池（延迟创建），不占用事件循环的默认线程池
+_LOCAL_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_REMOTE_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(local: bool) -> ThreadPoolExecutor:
+    """
+    获取同步 Embedding 调用的线程池
+
+    本地模型使用单线程线程池，避免多个推理同时运行时 PyTorch 的算子线程互相争抢 CPU；
+    远程 API 是 I/O 密集型，线程数按 min(32, CPU 数 + 4) 设置
+
+    Args:
+        local: 是否为本地运行的模型
+
+    Returns:
+        ThreadPoolExecutor: 线程池
+    """
+    global _LOCAL_EXECUTOR, _REMOTE_EXECUTOR
+    with _executor_lock:
+        if local:
+            if _LOCAL_EXECUTOR is None:
+                _LOCAL_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-local")
+            return _LOCAL_EXECUTOR
+        if _REMOTE_EXECUTOR is None:
+            _REMOTE_EXECUTOR = ThreadPoolExecutor(
+                max_workers=min(32, (os.cpu_count() or 1) + 4),
+                thread_name_prefix="embed-remote"
+            )
+        return _REMOTE_EXECUTOR
+
+
+# OpenAI 兼容接口共用的 HTTP 连接池配置：保持长连接，避免每次请求重新进行 TCP/TLS 握手
+_HTTPX_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0)
+_shared_http_client: Optional[httpx.Client] = None
+# 异步客户端的连接绑定在创建它的事件循环上，每个事件循环各用一个（索引任务每次通过 asyncio.run 新建循环）
+# 连接池中的长连接会反向引用事件循环，弱引用字典无法自动回收，需在循环结束前调用 release_event_loop_resources 释放
+_shared_async_http_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_http_client_lock = threading.Lock()
+
+
+def _shared_http_clients() -> Dict[str, Any]:
+    """
+    获取共享的 httpx 客户端，作为 OpenAIEmbeddings 的 http_client / http_async_client 参数
+
+    Returns:
+        Dict[str, Any]: 客户端参数；当前没有运行中的事件循环时只包含同步客户端
+    """
+    global _shared_http_client
+    with _http_client_lock:
+        if _shared_http_client is None:
+            _shared_http_client = httpx.Client(limits=_HTTPX_LIMITS)
+        clients: Dict[str, Any] = {"http_client": _shared_http_client}
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return clients
+
+        async_client = _shared_async_http_clients.get(loop)
+        if async_client is None:
+            async_client = httpx.AsyncClient(limits=_HTTPX_LIMITS)
+            _shared_async_http_clients[loop] = async_client
+        clients["http_async_client"] = async_client
+        return clients
+
+
+async def release_event_loop_resources() -> None:
+    """
+    释放当前事件循环专属的模型实例缓存和 HTTP 客户端
+
+    需在 asyncio.run 启动的任务结束前调用，关闭异步客户端的长连接，
+    否则已结束的事件循环和其持有的套接字会一直留在进程中
+    """
+    loop = asyncio.get_running_loop()
+    with _model_cache_lock:
+        _loop_model_caches.pop(loop, None)
+    with _http_client_lock:
+        async_client = _shared_async_http_clients.pop(loop, None)
+    if async_client is not None:
+        await async_client.aclose()
+
+
+def _cache_model_id(config: EmbeddingConfig) -> str:
+    """
+    向量缓存使用的模型标识
+
+    输出维度参数计入其中，避免不同维度的向量互相覆盖；API 地址和部署名也计入其中，
+    同名模型部署在不同的 OpenAI 兼容端点或 Azure 部署上时互不复用向量
+    """
+    dimensions = config.extra_params.get("dimensions") if config.extra_params else None
+    model_id = f"{config.model_name}@{dimensions}" if dimensions else config.model_name
+    if config.api_base:
+        model_id += f"|base={config.api_base}"
+    if config.deployment_name:
+        model_id += f"|deployment={config.deployment_name}"
+    return model_id
+
+
+def embed_query_cached(embedding_model: Embeddings, config: EmbeddingConfig, text: str) -> List[float]:
+    """
+    向量化查询问题，相同模型下的重复问题直接返回进程内缓存的向量
+
+    Args:
+        embedding_model: Embedding 模型实例
+        config: 模型对应的配置
+        text: 问题文本
+
+    Returns:
+        List[float]: 问题向量
+    """
+    key = (config.provider, _cache_model_id(config), text)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = embedding_model.embed_query(text)
+        query_embedding_cache.put(key, embedding)
+    return embedding
+
+
 class BatchEmbeddingProcessor:
     """批量向量化处理器"""
 
+    # 在本机运行模型的提供商：推理本身会占满 CPU，并发请求只会互相争抢线程
+    LOCAL_PROVIDERS = frozenset({"huggingface", "hf", "ollama"})
+
     def __init__(self, embedding_model: Embeddings, config: EmbeddingConfig):
         self.embedding_model = embedding_model
         self.config = config
         self.logger = logging.getLogger(__name__)
+        # 本地模型串行执行，远程 API 按配置并发
+        self.max_concurrency = 1 if config.provider in self.LOCAL_PROVIDERS else max(1, config.max_concurrent_requests)
+        self._embed_sem = asyncio.Semaphore(self.max_concurrency)
+        self.cache = get_embedding_cache()
+        self.memory_cache = memory_embedding_cache
 
     async def embed_documents_with_retry(self, texts: List[str]) -> List[List[float]]:
         """
@@ -103,15 +284,96 @@ class BatchEmbeddingProcessor:
         if not texts:
             return []
 
-        all_embeddings = []
+        # 先查进程内 LRU 缓存
+        model_id = self._model_id()
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        miss_indices = []
+        for i, text in enumerate(texts):
+            embedding = self.memory_cache.get((self.config.provider, model_id, text))
+            if embedding is None:
+                miss_indices.append(i)
+            else:
+                embeddings[i] = embedding
+
+        if miss_indices:
+            # 相同的文本（许可证头、模板代码等）只向量化一次，再按原位置回填
+            unique_texts = list(dict.fromkeys(texts[i] for i in miss_indices))
+            unique_embeddings = dict(zip(unique_texts, await self._embed_uncached(unique_texts)))
+            if len(unique_texts) < len(miss_indices):
+                self.logger.debug(f"批内去重: {len(miss_indices)} 条文本中有 {len(unique_texts)} 条不重复")
+
+            for text, embedding in unique_embeddings.items():
+                self.memory_cache.put((self.config.provider, model_id, text), embedding)
+            for i in miss_indices:
+                embeddings[i] = unique_embeddings[texts[i]]
+
+        return embeddings
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """返回进程内向量缓存的命中统计"""
+        return self.memory_cache.stats()
+
+    async def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """
+        向量化内存缓存未命中的文本：先查持久化缓存，只把仍未命中的文本发给 Embedding API
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            向量列表，顺序与输入一致
+        """
+        if self.cache is None:
+            return await self._embed_texts(texts)
+
+        keys = [self._cache_key(text) for text in texts]
+        try:
+            cached = await asyncio.to_thread(self.cache.get_many, keys)
+        except Exception as e:
+            self.logger.warning(f"读取向量缓存失败: {str(e)}")
+            cached = {}
+        miss_indices = [i for i, key in enumerate(keys) if key not in cached]
+        self.logger.debug(f"向量缓存命中 {len(texts) - len(miss_indices)}/{len(texts)}")
+
+        if miss_indices:
+            miss_embeddings = await self._embed_texts([texts[i] for i in miss_indices])
+            new_items = [(keys[i], embedding) for i, embedding in zip(miss_indices, miss_embeddings)]
+            try:
+                await asyncio.to_thread(self.cache.put_many, new_items)
+            except Exception as e:
+                self.logger.warning(f"写入向量缓存失败: {str(e)}")
+            cached.update(new_items)
+
+        return [cached[key] for key in keys]
+
+    async def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        分批调用 Embedding API 向量化文本
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            向量列表，顺序与输入一致
+        """
+        batches = [
+            texts[i:i + self.config.batch_size]
+            for i in range(0, len(texts), self.config.batch_size)
+        ]
+
+        # 各批次相互独立，同时发出请求，不必逐个等待网络往返；实际并发数由 _call_embedding_api 中的信号量限制
+        results = await asyncio.gather(*(self._embed_batch_with_retry(batch) for batch in batches))
+
+        # gather 按传入顺序返回结果，展平后与输入文本一一对应
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
 
-        # 分批处理
-        for i in range(0, len(texts), self.config.batch_size):
-            batch = texts[i:i + self.config.batch_size]
-            batch_embeddings = await self._embed_batch_with_retry(batch)
-            all_embeddings.extend(batch_embeddings)
+    def _model_id(self) -> str:
+        """缓存使用的模型标识"""
+        return _cache_model_id(self.config)
 
-        return all_embeddings
+    def _cache_key(self, text: str) -> bytes:
+        """生成文本的持久化缓存键"""
+        return EmbeddingCache.make_key(self.config.provider, self._model_id(), text)
 
     async def _embed_batch_with_retry(self, batch: List[str]) -> List[List[float]]:
         """
@@ -146,9 +408,8 @@ class BatchEmbeddingProcessor:
                 # 判断是否是速率限制错误
                 if self._is_rate_limit_error(e):
                     if attempt < self.config.max_retries:
-                        # 指数退避
-                        delay = self.config.retry_delay * (2 ** attempt)
-                        self.logger.info(f"遇到速率限制，等待 {delay} 秒后重试")
+                        delay = self._rate_limit_delay(e, attempt)
+                        self.logger.info(f"遇到速率限制，等待 {delay:.2f} 秒后重试")
                         await asyncio.sleep(delay)
                         continue
                     else:
@@ -177,46 +438,77 @@ class BatchEmbeddingProcessor:
             向量列表
         """
         try:
-            # 如果模型支持异步，使用异步方法
-            if hasattr(self.embedding_model, 'aembed_documents'):
-                return await self.embedding_model.aembed_documents(texts)
-            else:
-                # 否则在线程池中运行同步方法
-                import asyncio
-                loop = asyncio.get_event_loop()
-                return await loop.run_in_executor(
-                    None,
-                    self.embedding_model.embed_documents,
-                    texts
-                )
+            async with self._embed_sem:
+                # 模型自己实现了异步方法时直接使用；
+                # Embeddings 基类的默认 aembed_documents 只是把同步方法丢进默认线程池，这种情况改用专用线程池
+                if type(self.embedding_model).aembed_documents is not Embeddings.aembed_documents:
+                    return await self.embedding_model.aembed_documents(texts)
+                else:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(
+                        _get_executor(self.config.provider in self.LOCAL_PROVIDERS),
+                        self.embedding_model.embed_documents,
+                        texts
+                    )
         except Exception as e:
             self.logger.error(f"调用embedding API失败: {str(e)}")
             raise
 
+    def _rate_limit_delay(self, error: Exception, attempt: int) -> float:
+        """
+        计算速率限制后的重试等待时间
+
+        指数退避加随机抖动，避免并发批次同时重试再次触发限流；
+        服务端返回 Retry-After 时至少等待该时长，结果不超过 retry_delay_max
+
+        Args:
+            error: 触发重试的异常
+            attempt: 当前尝试序号（从 0 开始）
+
+        Returns:
+            float: 等待秒数
+        """
+        base = self.config.retry_delay * (2 ** attempt)
+        delay = random.uniform(base / 2, base)
+
+        retry_after = self._retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return min(delay, self.config.retry_delay_max)
+
+    @staticmethod
+    def _retry_after_seconds(error: Exception) -> Optional[float]:
+        """从异常携带的 HTTP 响应头中读取 Retry-After（秒），没有或无法解析时返回 None"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or getattr(error, "headers", None)
+        if not headers:
+            return None
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            return None
+
     def _is_rate_limit_error(self, error: Exception) -> bool:
         """检查是否是速率限制错误"""
-        error_str = str(error).lower()
-        rate_limit_indicators = [
-            'rate limit',
-            'too many requests',
-            'quota exceeded',
-            '429',
-            'rate_limit_exceeded'
-        ]
-        return any(indicator in error_str for indicator in rate_limit_indicators)
+        if isinstance(error, _RATE_LIMIT_ERROR_TYPES):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429
+        if isinstance(error, _TYPED_API_ERROR_TYPES):
+            return False
+        # 未知类型的异常才按错误信息匹配
+        return _matches_any(error, _RATE_LIMIT_INDICATORS)
 
     def _is_api_key_error(self, error: Exception) -> bool:
         """检查是否是API密钥错误"""
-        error_str = str(error).lower()
-        api_key_indicators = [
-            'api key',
-            'invalid key',
-            'unauthorized',
-            '401',
-            'authentication',
-            'invalid_api_key'
-        ]
-        return any(indicator in error_str for indicator in api_key_indicators)
+        if isinstance(error, _API_KEY_ERROR_TYPES):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 401
+        if isinstance(error, _TYPED_API_ERROR_TYPES):
+            return False
+        return _matches_any(error, _API_KEY_INDICATORS)
 
 
 class EmbeddingManager:
@@ -256,27 +548,39 @@ class EmbeddingManager:
             ValueError: 当提供商不支持时
             EmbeddingError: 当模型加载失败时
         """
-        logger.info(f"正在加载 {config.provider} 的 {config.model_name} 模型")
-        logger.info(f"🔍 [调试] EmbeddingManager - 接收到的config: provider={config.provider}, model={config.model_name}, api_key={'***' if config.api_key else 'None'}")
-
         # 检查提供商是否支持
         if config.provider not in EmbeddingManager.SUPPORTED_PROVIDERS:
             supported = list(EmbeddingManager.SUPPORTED_PROVIDERS.keys())
             raise ValueError(f"不支持的 embedding 提供商: {config.provider}。支持的提供商: {supported}")
 
+        # 相同配置复用已创建的模型实例（本地模型不必重新加载权重，远程 API 保留已建立的连接）
+        cache = _model_cache_for(config.provider)
+        key = _config_fingerprint(config)
+        with _model_cache_lock:
+            cached = cache.get(key)
+            if cached is not None:
+                cache.move_to_end(key)
+                return cached
+
+        logger.info(f"正在加载 {config.provider} 的 {config.model_name} 模型")
+        logger.info(f"🔍 [调试] EmbeddingManager - 接收到的config: provider={config.provider}, model={config.model_name}, api_key={'***' if config.api_key else 'None'}")
+
         try:
-            # 动态调用相应的创建方法
-            method_name = EmbeddingManager.SUPPORTED_PROVIDERS[config.provider]
-            logger.info(f"🔍 [调试] EmbeddingManager - 将调用方法: {method_name}")
-            method = getattr(EmbeddingManager, method_name)
-            result = method(config)
+            # 调用预先解析好的创建方法
+            factory = _PROVIDER_FACTORIES[config.provider]
+            logger.debug(f"🔍 [调试] EmbeddingManager - 将调用方法: {factory.__name__}")
+            result = factory(config)
             logger.info(f"🔍 [调试] EmbeddingManager - 创建的模型类型: {type(result)}")
-            return result
-
         except Exception as e:
             logger.error(f"加载 {config.provider} 模型失败: {str(e)}")
             raise EmbeddingError(f"模型加载失败: {str(e)}") from e
 
+        with _model_cache_lock:
+            cache[key] = result
+            while len(cache) > _MODEL_CACHE_SIZE:
+                cache.popitem(last=False)
+        return result
+
     @staticmethod
     def create_batch_processor(config: EmbeddingConfig) -> BatchEmbeddingProcessor:
         """
@@ -293,9 +597,11 @@ class EmbeddingManager:
 
 
     @staticmethod
-    def _create_openai_embeddings(config: EmbeddingConfig) -> OpenAIEmbeddings:
+    def _create_openai_embeddings(config: EmbeddingConfig) -> "OpenAIEmbeddings":
         """创建 OpenAI Embeddings 实例"""
         try:
+            from langchain_openai import OpenAIEmbeddings
+
             params = {
                 "model": config.model_name,
                 "show_progress_bar": True,
@@ -309,14 +615,19 @@ class EmbeddingManager:
             if config.api_base:
                 params["base_url"] = config.api_base
 
+            # 复用共享的 HTTP 连接池
+            params = {**_shared_http_clients(), **params}
+
             return OpenAIEmbeddings(**params)
         except Exception as e:
             raise EmbeddingError(f"创建 OpenAI 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_azure_embeddings(config: EmbeddingConfig) -> AzureOpenAIEmbeddings:
+    def _create_azure_embeddings(config: EmbeddingConfig) -> "AzureOpenAIEmbeddings":
         """创建 Azure OpenAI Embeddings 实例"""
         try:
+            from langchain_openai import AzureOpenAIEmbeddings
+
             params = {
                 "model": config.model_name,
                 "show_progress_bar": True,
@@ -339,12 +650,26 @@ class EmbeddingManager:
             raise EmbeddingError(f"创建 Azure OpenAI 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_huggingface_embeddings(config: EmbeddingConfig) -> HuggingFaceEmbeddings:
+    def _detect_local_device() -> str:
+        """检测本地模型可用的推理设备，有 CUDA 时使用 GPU，否则回退到 CPU"""
+        try:
+            import torch
+            return "cuda" if torch.cuda.is_available() else "cpu"
+        except ImportError:
+            return "cpu"
+
+    @staticmethod
+    def _create_huggingface_embeddings(config: EmbeddingConfig) -> "HuggingFaceEmbeddings":
         """创建 HuggingFace Embeddings 实例"""
         try:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+
             params = {
                 "model_name": config.model_name,
                 "show_progress": True,
+                # 本地模型优先放到 GPU 上，并按批次调用 SentenceTransformer.encode
+                "model_kwargs": {"device": EmbeddingManager._detect_local_device()},
+                "encode_kwargs": {"batch_size": config.batch_size},
                 **config.extra_params
             }
 
@@ -359,9 +684,11 @@ class EmbeddingManager:
             raise EmbeddingError(f"创建 HuggingFace 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_ollama_embeddings(config: EmbeddingConfig) -> OllamaEmbeddings:
+    def _create_ollama_embeddings(config: EmbeddingConfig) -> "OllamaEmbeddings":
         """创建 Ollama Embeddings 实例"""
         try:
+            from langchain_community.embeddings import OllamaEmbeddings
+
             params = {
                 "model": config.model_name,
                 "base_url": config.api_base or "http://localhost:11434",
@@ -373,9 +700,11 @@ class EmbeddingManager:
             raise EmbeddingError(f"创建 Ollama 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_google_embeddings(config: EmbeddingConfig) -> GoogleGenerativeAIEmbeddings:
+    def _create_google_embeddings(config: EmbeddingConfig) -> "GoogleGenerativeAIEmbeddings":
         """创建 Google Generative AI Embeddings 实例"""
         try:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
             params = {
                 "model": config.model_name,
                 **config.extra_params
@@ -389,9 +718,11 @@ class EmbeddingManager:
             raise EmbeddingError(f"创建 Google 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_deepseek_embeddings(config: EmbeddingConfig) -> OpenAIEmbeddings:
+    def _create_deepseek_embeddings(config: EmbeddingConfig) -> "OpenAIEmbeddings":
         """创建 DeepSeek Embeddings 实例（使用 OpenAI 兼容接口）"""
         try:
+            from langchain_openai import OpenAIEmbeddings
+
             params = {
                 "model": config.model_name,
                 "base_url": config.api_base or "https://api.deepseek.com/v1",
@@ -404,14 +735,19 @@ class EmbeddingManager:
             if config.api_key:
                 params["api_key"] = config.api_key
 
+            # 复用共享的 HTTP 连接池
+            params = {**_shared_http_clients(), **params}
+
             return OpenAIEmbeddings(**params)
         except Exception as e:
             raise EmbeddingError(f"创建 DeepSeek 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_qwen_embeddings(config: EmbeddingConfig) -> OpenAIEmbeddings:
+    def _create_qwen_embeddings(config: EmbeddingConfig) -> "OpenAIEmbeddings":
         """创建 通义千问 Embeddings 实例（使用 OpenAI 兼容接口）"""
         try:
+            from langchain_openai import OpenAIEmbeddings
+
             # API Key 优先级：配置中的 api_key > 环境变量 QWEN_API_KEY > 环境变量 DASHSCOPE_API_KEY
             api_key = config.api_key or settings.QWEN_API_KEY or settings.DASHSCOPE_API_KEY
             
@@ -433,14 +769,19 @@ class EmbeddingManager:
                 **extra_params
             }
 
+            # 复用共享的 HTTP 连接池
+            params = {**_shared_http_clients(), **params}
+
             return OpenAIEmbeddings(**params)
         except Exception as e:
             raise EmbeddingError(f"创建 通义千问 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_zhipu_embeddings(config: EmbeddingConfig) -> OpenAIEmbeddings:
+    def _create_zhipu_embeddings(config: EmbeddingConfig) -> "OpenAIEmbeddings":
         """创建 智谱 AI Embeddings 实例（使用 OpenAI 兼容接口）"""
         try:
+            from langchain_openai import OpenAIEmbeddings
+
             params = {
                 "model": config.model_name,
                 "base_url": config.api_base or "https://open.bigmodel.cn/api/paas/v4",
@@ -453,14 +794,19 @@ class EmbeddingManager:
             if config.api_key:
                 params["api_key"] = config.api_key
 
+            # 复用共享的 HTTP 连接池
+            params = {**_shared_http_clients(), **params}
+
             return OpenAIEmbeddings(**params)
         except Exception as e:
             raise EmbeddingError(f"创建 智谱 AI 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_baichuan_embeddings(config: EmbeddingConfig) -> OpenAIEmbeddings:
+    def _create_baichuan_embeddings(config: EmbeddingConfig) -> "OpenAIEmbeddings":
         """创建 百川 AI Embeddings 实例（使用 OpenAI 兼容接口）"""
         try:
+            from langchain_openai import OpenAIEmbeddings
+
             params = {
                 "model": config.model_name,
                 "base_url": config.api_base or "https://api.baichuan-ai.com/v1",
@@ -473,6 +819,9 @@ class EmbeddingManager:
             if config.api_key:
                 params["api_key"] = config.api_key
 
+            # 复用共享的 HTTP 连接池
+            params = {**_shared_http_clients(), **params}
+
             return OpenAIEmbeddings(**params)
         except Exception as e:
             raise EmbeddingError(f"创建 百川 AI 模型失败: {str(e)}") from e
@@ -526,9 +875,11 @@ class EmbeddingManager:
             raise EmbeddingError(f"创建 Mistral 模型失败: {str(e)}") from e
 
     @staticmethod
-    def _create_jina_embeddings(config: EmbeddingConfig) -> OpenAIEmbeddings:
+    def _create_jina_embeddings(config: EmbeddingConfig) -> "OpenAIEmbeddings":
         """创建 Jina AI Embeddings 实例（使用 OpenAI 兼容接口）"""
         try:
+            from langchain_openai import OpenAIEmbeddings
+
             params = {
                 "model": config.model_name,
                 "base_url": config.api_base or "https://api.jina.ai/v1",
@@ -541,6 +892,9 @@ class EmbeddingManager:
             if config.api_key:
                 params["api_key"] = config.api_key
 
+            # 复用共享的 HTTP 连接池
+            params = {**_shared_http_clients(), **params}
+
             return OpenAIEmbeddings(**params)
         except Exception as e:
             raise EmbeddingError(f"创建 Jina AI 模型失败: {str(e)}") from e
@@ -586,6 +940,65 @@ class EmbeddingManager:
         return True
 
 
+# 每个缓存最多保留的模型实例数
+_MODEL_CACHE_SIZE = 32
+# 本地模型不绑定事件循环，整个进程共用一个缓存
+_model_cache: "OrderedDict[Tuple, Embeddings]" = OrderedDict()
+# 远程 API 的异步客户端绑定在创建时的事件循环上，按事件循环分别缓存，由 release_event_loop_resources 在循环结束前释放
+_loop_model_caches: "Dict[asyncio.AbstractEventLoop, OrderedDict[Tuple, Embeddings]]" = {}
+_model_cache_lock = threading.Lock()
+
+
+def _config_fingerprint(config: EmbeddingConfig) -> Tuple:
+    """
+    生成模型配置的指纹，作为模型实例缓存的键
+
+    API Key 只保留哈希前缀，不以明文形式常驻在缓存键中
+
+    Args:
+        config: Embedding 模型配置
+
+    Returns:
+        Tuple: 可哈希的配置指纹
+    """
+    api_key_fingerprint = hashlib.sha256(config.api_key.encode()).hexdigest()[:16] if config.api_key else None
+    extra_params = tuple(sorted((key, repr(value)) for key, value in (config.extra_params or {}).items()))
+    return (
+        config.provider,
+        config.model_name,
+        config.api_base,
+        config.api_version,
+        config.deployment_name,
+        api_key_fingerprint,
+        config.max_retries,
+        config.timeout,
+        config.batch_size,
+        extra_params,
+    )
+
+
+def _model_cache_for(provider: str) -> "OrderedDict[Tuple, Embeddings]":
+    """获取提供商对应的模型实例缓存"""
+    if provider in BatchEmbeddingProcessor.LOCAL_PROVIDERS:
+        return _model_cache
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _model_cache
+    with _model_cache_lock:
+        cache = _loop_model_caches.get(loop)
+        if cache is None:
+            cache = OrderedDict()
+            _loop_model_caches[loop] = cache
+        return cache
+
+
+# 提供商到创建方法的映射，在模块加载时解析一次，避免每次创建模型都通过 getattr 查找
+_PROVIDER_FACTORIES: Dict[str, Callable[[EmbeddingConfig], Embeddings]] = {
+    provider: getattr(EmbeddingManager, method_name)
+    for provider, method_name in EmbeddingManager.SUPPORTED_PROVIDERS.items()
+}
+
 
 def get_embedding_model(
         provider: str,
@@ -14,13 +14,16 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from ..core.config import settings
-from ..db.session import get_db_session
+from ..db.session import get_db_session, bulk_copy_file_metadata
 from ..db.models import AnalysisSession, FileMetadata, TaskStatus, Repository
 from ..utils.git_helper import GitHelper
 from ..utils.file_parser import FileParser
 from ..utils.ast_parser import AstParser
-from ..services.embedding_manager import EmbeddingManager, EmbeddingConfig, BatchEmbeddingProcessor
+from ..services.embedding_manager import (
+    EmbeddingManager, EmbeddingConfig, BatchEmbeddingProcessor, release_event_loop_resources
+)
 from ..services.vector_store import get_vector_store
+from ..services.session_cache import build_session_status, publish_session_status
 
 logger = logging.getLogger(__name__)
 
@@ -350,6 +353,19 @@ class IngestionService:
         return processed_files, total_chunks, all_documents
 
 
+    @staticmethod
+    def _file_metadata_row(metadata: FileMetadata) -> Dict[str, Any]:
+        """将未持久化的 FileMetadata 对象转换为 INSERT 参数，未赋值的列使用模型默认值"""
+        row = {}
+        for column in FileMetadata.__table__.columns:
+            if column.primary_key or column.server_default is not None:
+                continue
+            value = getattr(metadata, column.key)
+            if value is None and column.default is not None and column.default.is_scalar:
+                value = column.default.arg
+            row[column.key] = value
+        return row
+
     def _save_metadata_batch(self, db: Session, metadata_batch: List[FileMetadata]):
         """
         保存一批文件元数据。如果批量保存失败，则尝试逐个保存。
@@ -358,7 +374,8 @@ class IngestionService:
             return
 
         try:
-            db.add_all(metadata_batch)
+            # PostgreSQL 下用 COPY 一次写入整批记录，其余数据库使用 executemany INSERT
+            bulk_copy_file_metadata(db, [self._file_metadata_row(metadata) for metadata in metadata_batch])
             db.commit()
             logger.info(f"✅ [元数据保存] 成功保存 {len(metadata_batch)} 个文件元数据。")
         except Exception as e:
@@ -447,6 +464,9 @@ class IngestionService:
             error_msg = f"异步向量化和存储失败: {str(e)}"
             logger.error(f"💥 [异步向量化失败] 会话ID: {session_id} - {error_msg}")
             raise Exception(error_msg)
+        finally:
+            # 事件循环即将随 asyncio.run 结束，关闭绑定在其上的 HTTP 连接
+            await release_event_loop_resources()
 
 
     @retry(
@@ -581,7 +601,10 @@ class IngestionService:
                 if completed_at:
                     session.completed_at = completed_at
 
+                # 提交前构建状态快照，提交后对象已过期，再读取属性需要重新查询
+                snapshot = build_session_status(session)
                 db.commit()
+                publish_session_status(snapshot)
 
         except Exception as e:
             logger.error(f"更新会话状态失败: {str(e)}")
@@ -605,7 +628,9 @@ class IngestionService:
                 session.repository_name = repo_name
                 session.repository_owner = repo_owner
                 session.repository_identifier = repo_identifier
+                snapshot = build_session_status(session)
                 db.commit()
+                publish_session_status(snapshot)
                 logger.info(f"✅ [数据库更新] 会话ID: {session_id} - 仓库信息已更新: {repo_owner}/{repo_name} -> {repo_identifier}")
 
         except Exception as e:
@@ -637,7 +662,9 @@ class IngestionService:
                 if indexed_chunks is not None:
                     session.indexed_chunks = indexed_chunks
 
+                snapshot = build_session_status(session)
                 db.commit()
+                publish_session_status(snapshot)
 
         except Exception as e:
             logger.error(f"更新会话统计失败: {str(e)}")
@@ -9,6 +9,7 @@ import logging
 import re
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from rank_bm25 import BM25Okapi
 
@@ -16,9 +17,10 @@ from ..core.config import settings
 from ..db.session import get_db_session
 from ..db.models import AnalysisSession, QueryLog, TaskStatus, Repository
 from ..utils.git_helper import GitHelper
-from ..services.embedding_manager import EmbeddingManager, EmbeddingConfig
+from ..services.embedding_manager import EmbeddingManager, EmbeddingConfig, embed_query_cached
 from ..services.llm_manager import LLMManager, LLMConfig
 from ..services.vector_store import get_vector_store
+from ..services.session_cache import get_bm25_cache_generation
 from ..schemas.repository import (
     QueryRequest, QueryResponse, RetrievedChunk,
     GenerationMode, LLMConfig as LLMConfigSchema
@@ -33,6 +35,7 @@ class QueryService:
     def __init__(self):
         self._bm25_cache = {}  # 缓存 BM25 索引
         self._documents_cache = {}  # 缓存文档内容
+        self._cache_generation = None  # 上次同步时的 BM25 缓存代数
         self.git_helper = GitHelper()  # Git助手实例
     
     def clear_cache(self, identifier: str = None):
@@ -51,6 +54,14 @@ class QueryService:
             self._documents_cache.clear()
             logger.info(f"🧹 [缓存清除] 已清除所有BM25缓存")
 
+    def _sync_cache_generation(self):
+        """BM25 缓存代数与上次同步时不同（API 请求过清除缓存）时，清空本进程的 BM25 缓存"""
+        generation = get_bm25_cache_generation()
+        if generation is not None and generation != self._cache_generation:
+            if self._cache_generation is not None or self._bm25_cache:
+                self.clear_cache()
+            self._cache_generation = generation
+
     def query(self, request: QueryRequest) -> QueryResponse:
         """
         处理查询请求
@@ -62,24 +73,29 @@ class QueryService:
             QueryResponse: 查询响应
         """
         start_time = time.time()
+        self._sync_cache_generation()
         db = get_db_session()
 
         try:
-            # 添加详细的调试日志
-            logger.info(f"🔍 [DEBUG] QueryRequest 对象类型和内容:")
-            logger.info(f"🔍 [DEBUG] - session_id: {request.session_id} (type: {type(request.session_id)})")
-            logger.info(f"🔍 [DEBUG] - question: {request.question[:50]}... (type: {type(request.question)})")
-            logger.info(f"🔍 [DEBUG] - generation_mode: {request.generation_mode} (type: {type(request.generation_mode)})")
-            logger.info(f"🔍 [DEBUG] - llm_config: {request.llm_config} (type: {type(request.llm_config)})")
+            # 添加详细的调试日志（拼接为一条记录输出，避免逐行加锁写日志）
+            debug_lines = [
+                "🔍 [DEBUG] QueryRequest 对象类型和内容:",
+                f"🔍 [DEBUG] - session_id: {request.session_id} (type: {type(request.session_id)})",
+                f"🔍 [DEBUG] - question: {request.question[:50]}... (type: {type(request.question)})",
+                f"🔍 [DEBUG] - generation_mode: {request.generation_mode} (type: {type(request.generation_mode)})",
+                f"🔍 [DEBUG] - llm_config: {request.llm_config} (type: {type(request.llm_config)})",
+            ]
             
             if request.llm_config:
-                logger.info(f"🔍 [DEBUG] LLMConfig 详细信息:")
-                logger.info(f"🔍 [DEBUG] - provider: {request.llm_config.provider} (type: {type(request.llm_config.provider)})")
-                logger.info(f"🔍 [DEBUG] - model_name: {request.llm_config.model_name} (type: {type(request.llm_config.model_name)})")
+                debug_lines.append("🔍 [DEBUG] LLMConfig 详细信息:")
+                debug_lines.append(f"🔍 [DEBUG] - provider: {request.llm_config.provider} (type: {type(request.llm_config.provider)})")
+                debug_lines.append(f"🔍 [DEBUG] - model_name: {request.llm_config.model_name} (type: {type(request.llm_config.model_name)})")
                 if hasattr(request.llm_config.provider, 'value'):
-                    logger.info(f"🔍 [DEBUG] - provider.value: {request.llm_config.provider.value}")
+                    debug_lines.append(f"🔍 [DEBUG] - provider.value: {request.llm_config.provider.value}")
                 else:
-                    logger.info(f"🔍 [DEBUG] - provider 没有 .value 属性")
+                    debug_lines.append("🔍 [DEBUG] - provider 没有 .value 属性")
+            
+            logger.info("\n".join(debug_lines))
             
             # 验证会话或仓库
             validation_result = self._validate_session_or_repository(db, request.session_id)
@@ -324,7 +340,7 @@ class QueryService:
 
             # 向量化问题
             logger.debug(f"🧠 [问题向量化] 仓库: {repository_identifier} - 正在将问题转换为向量...")
-            question_embedding = embedding_model.embed_query(question)
+            question_embedding = embed_query_cached(embedding_model, embedding_cfg, question)
             logger.debug(f"✅ [向量生成] 仓库: {repository_identifier} - 问题向量化完成，维度: {len(question_embedding)}")
 
             # 在向量数据库中搜索
@@ -693,16 +709,17 @@ class QueryService:
             
             # 创建 LLM 配置对象
             logger.debug(f"⚙️ [LLM配置] 提供商: {llm_config.provider}, 模型: {llm_config.model_name}, 温度: {llm_config.temperature}, 最大令牌: {llm_config.max_tokens}")
-            logger.info(f"🔍 [DEBUG] _generate_answer 中的 llm_config:")
-            logger.info(f"🔍 [DEBUG] - llm_config.provider: {llm_config.provider} (type: {type(llm_config.provider)})")
-            logger.info(f"🔍 [DEBUG] - hasattr(llm_config.provider, 'value'): {hasattr(llm_config.provider, 'value')}")
-            
             provider_value = llm_config.provider.value if hasattr(llm_config.provider, 'value') else llm_config.provider
-            logger.info(f"🔍 [DEBUG] - 最终使用的 provider 值: {provider_value} (type: {type(provider_value)})")
             
             # 处理 extra_params，确保它是一个字典
             extra_params = llm_config.extra_params or {}
-            logger.info(f"🔍 [DEBUG] - extra_params: {extra_params} (type: {type(extra_params)})")
+            logger.info("\n".join([
+                "🔍 [DEBUG] _generate_answer 中的 llm_config:",
+                f"🔍 [DEBUG] - llm_config.provider: {llm_config.provider} (type: {type(llm_config.provider)})",
+                f"🔍 [DEBUG] - hasattr(llm_config.provider, 'value'): {hasattr(llm_config.provider, 'value')}",
+                f"🔍 [DEBUG] - 最终使用的 provider 值: {provider_value} (type: {type(provider_value)})",
+                f"🔍 [DEBUG] - extra_params: {extra_params} (type: {type(extra_params)})",
+            ]))
             
             llm_cfg = LLMConfig(
                 provider=provider_value,
@@ -815,7 +832,8 @@ class QueryService:
             retrieved_chunks: 检索结果
         """
         try:
-            query_log = QueryLog(
+            # Core INSERT 直接写入，不构建 ORM 对象；日志记录写入后不再读取，无需 RETURNING 回读主键和时间戳
+            db.execute(insert(QueryLog).values(
                 session_id=request.session_id,
                 question=request.question,
                 answer=response.answer,
@@ -825,9 +843,7 @@ class QueryService:
                 retrieval_time=response.retrieval_time,
                 generation_time=response.generation_time,
                 total_time=response.total_time
-            )
-
-            db.add(query_log)
+            ))
             db.commit()
 
         except Exception as e:
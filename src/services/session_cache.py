@@ -0,0 +1,307 @@
+"""
+会话状态缓存与事件推送
+Worker 在会话状态变化时把状态快照写入 Redis 并发布事件，API 通过连接池异步读取快照，
+或通过 WebSocket 订阅事件，避免客户端轮询时反复查询数据库和 Celery 结果后端
+"""
+
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, AsyncIterator, Union
+
+import orjson
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import select, Select, Row
+
+from ..core.config import settings
+from ..db.models import AnalysisSession
+from ..schemas.repository import SessionStatusResponse
+
+logger = logging.getLogger(__name__)
+
+# 会话状态快照的 Redis 键
+SESSION_STATUS_KEY = "session:{session_id}:status"
+# 会话事件的 Redis 发布/订阅频道
+SESSION_EVENTS_CHANNEL = "session:{session_id}:events"
+# 查询结果的 Redis 键（Worker 直接写入紧凑 JSON，绕过 Celery 结果后端）
+QUERY_RESULT_KEY = "result:{session_id}"
+# BM25 缓存代数：API 清除缓存时递增，各 Worker 发现代数变化后清空本进程的 BM25 缓存
+BM25_CACHE_GENERATION_KEY = "bm25:cache_generation"
+
+# 状态响应实际用到的列，查询时只选取这些列（跳过 embedding_config 等大字段）
+SESSION_STATUS_COLUMNS = (
+    AnalysisSession.session_id,
+    AnalysisSession.status,
+    AnalysisSession.repository_url,
+    AnalysisSession.repository_name,
+    AnalysisSession.repository_owner,
+    AnalysisSession.total_files,
+    AnalysisSession.processed_files,
+    AnalysisSession.total_chunks,
+    AnalysisSession.indexed_chunks,
+    AnalysisSession.created_at,
+    AnalysisSession.started_at,
+    AnalysisSession.completed_at,
+    AnalysisSession.error_message,
+)
+
+# 进程级连接池（延迟创建）
+_sync_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+_pubsub_client: Optional[aioredis.Redis] = None
+
+
+def get_redis_client() -> redis.Redis:
+    """获取同步 Redis 客户端（Worker 使用，进程内共享连接池）"""
+    global _sync_client
+    if _sync_client is None:
+        pool = redis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS
+        )
+        _sync_client = redis.Redis(connection_pool=pool)
+    return _sync_client
+
+
+def get_async_redis_client() -> aioredis.Redis:
+    """获取异步 Redis 客户端（API 使用，进程内共享连接池）"""
+    global _async_client
+    if _async_client is None:
+        pool = aioredis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS
+        )
+        _async_client = aioredis.Redis(connection_pool=pool)
+    return _async_client
+
+
+def get_async_pubsub_redis_client() -> aioredis.Redis:
+    """
+    获取订阅专用的异步 Redis 客户端
+
+    订阅会在整个等待期间独占一个连接，使用独立的连接池，
+    避免大量 WebSocket 或长轮询耗尽命令连接池，导致状态读取和事件发布失败
+    """
+    global _pubsub_client
+    if _pubsub_client is None:
+        pool = aioredis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_PUBSUB_MAX_CONNECTIONS
+        )
+        _pubsub_client = aioredis.Redis(connection_pool=pool)
+    return _pubsub_client
+
+
+def select_session_status(session_id: str) -> Select:
+    """
+    构建只选取状态列的会话查询语句
+
+    返回普通的 Row 而不是 ORM 对象，省去实体构建和 identity map 的开销
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        Select: 可交给 build_session_status 使用的查询语句
+    """
+    return select(*SESSION_STATUS_COLUMNS).where(AnalysisSession.session_id == session_id)
+
+
+def build_session_status(session: Union[AnalysisSession, Row]) -> Dict[str, Any]:
+    """
+    构建会话状态响应数据
+
+    Args:
+        session: 分析会话记录，或 select_session_status 查询得到的行
+
+    Returns:
+        Dict[str, Any]: 可直接返回给客户端的状态数据
+    """
+    return SessionStatusResponse.model_validate(session).model_dump(mode="json")
+
+
+def publish_session_status(status: Dict[str, Any]) -> None:
+    """
+    写入会话状态快照并发布状态事件（同步，供 Worker 在提交数据库后调用）
+
+    缓存写入失败不影响主流程，API 会回退到数据库查询。
+    状态数据应在提交前构建：提交后 ORM 对象已过期，再读取属性会多一次 SELECT。
+
+    Args:
+        status: build_session_status 生成的状态数据
+    """
+    try:
+        # 写快照和发布事件放在同一个 pipeline 中，只需一次往返
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.set(
+            SESSION_STATUS_KEY.format(session_id=status["session_id"]),
+            orjson.dumps(status),
+            ex=settings.SESSION_STATUS_CACHE_TTL
+        )
+        pipe.publish(
+            SESSION_EVENTS_CHANNEL.format(session_id=status["session_id"]),
+            orjson.dumps({"type": "status", "data": status})
+        )
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ [状态缓存] 写入会话状态失败 - 会话ID: {status.get('session_id')}, 错误: {str(e)}")
+
+
+def publish_query_result(session_id: str, result: Dict[str, Any]) -> None:
+    """
+    写入查询结果并发布 result 事件（同步，供 Worker 在查询任务结束时调用）
+
+    API 读取结果时只需一次 GET，不必经过 Celery AsyncResult 的反序列化和状态判断。
+
+    Args:
+        session_id: 查询任务会话ID
+        result: 查询任务返回的结果数据
+    """
+    try:
+        payload = orjson.dumps(result)
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.set(
+            QUERY_RESULT_KEY.format(session_id=session_id),
+            payload,
+            ex=settings.QUERY_RESULT_CACHE_TTL
+        )
+        pipe.publish(
+            SESSION_EVENTS_CHANNEL.format(session_id=session_id),
+            b'{"type":"result","data":' + payload + b"}"
+        )
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ [结果缓存] 写入查询结果失败 - 会话ID: {session_id}, 错误: {str(e)}")
+
+
+def get_bm25_cache_generation() -> Optional[bytes]:
+    """
+    读取 BM25 缓存代数（同步，供 Worker 在处理查询前调用）
+
+    Returns:
+        Optional[bytes]: 当前代数，从未清除过或 Redis 不可用时返回 None
+    """
+    try:
+        return get_redis_client().get(BM25_CACHE_GENERATION_KEY)
+    except Exception as e:
+        logger.warning(f"⚠️ [BM25缓存] 读取缓存代数失败: {str(e)}")
+        return None
+
+
+async def bump_bm25_cache_generation() -> None:
+    """递增 BM25 缓存代数，通知所有 Worker 在下次查询前清空 BM25 缓存"""
+    await get_async_redis_client().incr(BM25_CACHE_GENERATION_KEY)
+
+
+async def get_stored_query_result(session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    从 Redis 读取 Worker 写入的查询结果
+
+    Args:
+        session_id: 查询任务会话ID
+
+    Returns:
+        Optional[Dict[str, Any]]: 结果数据，未命中或 Redis 不可用时返回 None
+    """
+    try:
+        raw = await get_async_redis_client().get(QUERY_RESULT_KEY.format(session_id=session_id))
+    except Exception as e:
+        logger.warning(f"⚠️ [结果缓存] 读取查询结果失败 - 会话ID: {session_id}, 错误: {str(e)}")
+        return None
+
+    return orjson.loads(raw) if raw else None
+
+
+async def cache_session_status(status: Dict[str, Any]) -> None:
+    """
+    将会话状态快照写入 Redis（异步，供 API 回源数据库后回填）
+
+    仅在键不存在时写入：数据库读取与写入之间 Worker 可能已发布了更新的快照，不能被旧数据覆盖
+
+    Args:
+        status: build_session_status 生成的状态数据
+    """
+    try:
+        await get_async_redis_client().set(
+            SESSION_STATUS_KEY.format(session_id=status["session_id"]),
+            orjson.dumps(status),
+            ex=settings.SESSION_STATUS_CACHE_TTL,
+            nx=True
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ [状态缓存] 回填会话状态失败 - 会话ID: {status.get('session_id')}, 错误: {str(e)}")
+
+
+async def publish_session_status_async(status: Dict[str, Any]) -> None:
+    """
+    写入会话状态快照并发布状态事件（异步，供 API 在修改会话状态后调用）
+
+    Args:
+        status: build_session_status 生成的状态数据
+    """
+    try:
+        pipe = get_async_redis_client().pipeline(transaction=False)
+        pipe.set(
+            SESSION_STATUS_KEY.format(session_id=status["session_id"]),
+            orjson.dumps(status),
+            ex=settings.SESSION_STATUS_CACHE_TTL
+        )
+        pipe.publish(
+            SESSION_EVENTS_CHANNEL.format(session_id=status["session_id"]),
+            orjson.dumps({"type": "status", "data": status})
+        )
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ [状态缓存] 写入会话状态失败 - 会话ID: {status.get('session_id')}, 错误: {str(e)}")
+
+
+@asynccontextmanager
+async def subscribe_session_events(session_id: str) -> AsyncIterator[aioredis.client.PubSub]:
+    """
+    订阅会话事件频道，退出时自动取消订阅并释放连接
+
+    Args:
+        session_id: 会话ID
+
+    Yields:
+        PubSub: 已订阅该会话事件频道的 PubSub 实例
+    """
+    channel = SESSION_EVENTS_CHANNEL.format(session_id=session_id)
+    pubsub = get_async_pubsub_redis_client().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(channel)
+    try:
+        yield pubsub
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
+
+
+async def get_cached_session_status_raw(session_id: str) -> Optional[bytes]:
+    """
+    从 Redis 读取序列化后的会话状态快照，不做反序列化
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        Optional[bytes]: 快照 JSON，未命中或 Redis 不可用时返回 None
+    """
+    try:
+        return await get_async_redis_client().get(SESSION_STATUS_KEY.format(session_id=session_id))
+    except Exception as e:
+        logger.warning(f"⚠️ [状态缓存] 读取会话状态失败 - 会话ID: {session_id}, 错误: {str(e)}")
+        return None
+
+
+async def get_cached_session_status(session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    从 Redis 读取会话状态快照
+
+    Args:
+        session_id: 会话ID
+
+    Returns:
+        Optional[Dict[str, Any]]: 状态数据，未命中或 Redis 不可用时返回 None
+    """
+    raw = await get_cached_session_status_raw(session_id)
+    return orjson.loads(raw) if raw else None
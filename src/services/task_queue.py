@@ -1,9 +1,12 @@
-import json
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from fastapi.concurrency import run_in_threadpool
 from ..schemas.repository import QueryRequest
-from ..worker.tasks import process_query
+from ..worker.tasks import process_query, process_repository_task
+import orjson
+from .session_cache import QUERY_RESULT_KEY, get_async_redis_client, get_stored_query_result
 from celery.result import AsyncResult
+from celery.states import READY_STATES
 from celery.exceptions import Retry, WorkerLostError
 
 logger = logging.getLogger(__name__)
@@ -16,7 +19,9 @@ class TaskQueue:
         """Push query task to Celery"""
         try:
             # 使用Celery任务，task_id就是session_id
-            task = process_query.apply_async(
+            # 投递会同步写 broker，放到线程池执行以免阻塞事件循环
+            task = await run_in_threadpool(
+                process_query.apply_async,
                 args=[session_id, request.model_dump()],  # 使用 model_dump() 替代 dict()
                 task_id=session_id,
                 retry=True,
@@ -33,8 +38,44 @@ class TaskQueue:
             logger.error(f"Failed to submit task {session_id}: {str(e)}")
             raise
         
+    async def push_repository_task(
+            self,
+            task_id: str,
+            repo_url: str,
+            session_id: str,
+            embedding_config: Dict[str, Any]
+    ) -> str:
+        """
+        投递仓库分析任务
+
+        投递会同步写 broker，放到线程池执行以免阻塞事件循环
+
+        Args:
+            task_id: 预先生成的 Celery 任务ID
+            repo_url: 仓库URL
+            session_id: 会话ID
+            embedding_config: Embedding配置字典
+
+        Returns:
+            str: Celery 任务ID
+        """
+        task = await run_in_threadpool(
+            process_repository_task.apply_async,
+            kwargs={
+                "repo_url": repo_url,
+                "session_id": session_id,
+                "embedding_config": embedding_config
+            },
+            task_id=task_id
+        )
+        return task.id
+        
     async def get_query_result(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get query result from Celery"""
+        """Get query result, reading the worker-written Redis key before falling back to Celery"""
+        stored = await get_stored_query_result(session_id)
+        if stored is not None:
+            return stored
+        
         try:
             result = AsyncResult(session_id)
             
@@ -87,8 +128,8 @@ class TaskQueue:
     async def cancel_task(self, session_id: str) -> bool:
         """Cancel a task"""
         try:
-            result = AsyncResult(session_id)
-            result.revoke(terminate=True)
+            # revoke 会同步写 broker，放到线程池执行以免阻塞事件循环
+            await run_in_threadpool(AsyncResult(session_id).revoke, terminate=True)
             logger.info(f"Task {session_id} cancelled successfully")
             return True
         except Exception as e:
@@ -98,8 +139,8 @@ class TaskQueue:
     async def cancel_repository_task(self, task_id: str) -> bool:
         """Cancel a repository analysis task"""
         try:
-            result = AsyncResult(task_id)
-            result.revoke(terminate=True)
+            # revoke 会同步写 broker，放到线程池执行以免阻塞事件循环
+            await run_in_threadpool(AsyncResult(task_id).revoke, terminate=True)
             logger.info(f"🛑 [任务取消] 仓库分析任务已取消 - 任务ID: {task_id}")
             return True
         except Exception as e:
@@ -138,4 +179,95 @@ class TaskQueue:
                 "error": str(e)
             }
 
+    @staticmethod
+    def _format_task_error(result: Any) -> str:
+        """将 Celery 结果后端中序列化的异常还原为与 str(AsyncResult.info) 一致的文本"""
+        if isinstance(result, dict) and "exc_type" in result:
+            args = result.get("exc_message") or []
+            if isinstance(args, (list, tuple)):
+                return str(args[0]) if len(args) == 1 else str(tuple(args))
+            return str(args)
+        return str(result) if result else "Unknown error"
+
+    async def get_status_bundle(self, session_id: str) -> Dict[str, Any]:
+        """
+        一次 Redis 往返获取任务的状态、结果和错误信息
+
+        用 MGET 同时读取 Celery 结果后端中的任务元数据和 Worker 写入的结果键，返回结构与 get_task_info 一致，
+        用于替代 get_task_status + get_task_info + get_query_result 的多次查询。
+
+        Args:
+            session_id: 任务ID
+
+        Returns:
+            Dict[str, Any]: 任务信息
+        """
+        try:
+            # 同时读取 Worker 直接写入的结果键：任务函数返回前结果键就已写入，
+            # 此时 Celery 元数据可能还未更新
+            raw, raw_result = await get_async_redis_client().mget(
+                f"{self.result_prefix}{session_id}",
+                QUERY_RESULT_KEY.format(session_id=session_id)
+            )
+        except Exception as e:
+            logger.error(f"Error getting status bundle for {session_id}: {str(e)}")
+            return {
+                "task_id": session_id,
+                "status": "UNKNOWN",
+                "error": str(e)
+            }
+
+        return self._build_status_bundle(session_id, raw, raw_result)
+
+    async def get_status_bundles(self, session_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        一次 MGET 批量获取多个任务的状态信息
+
+        Args:
+            session_ids: 任务ID列表
+
+        Returns:
+            List[Dict[str, Any]]: 与 session_ids 顺序一致的任务信息，结构同 get_status_bundle
+        """
+        if not session_ids:
+            return []
+
+        keys = [f"{self.result_prefix}{session_id}" for session_id in session_ids]
+        keys += [QUERY_RESULT_KEY.format(session_id=session_id) for session_id in session_ids]
+        try:
+            values = await get_async_redis_client().mget(keys)
+        except Exception as e:
+            logger.error(f"Error getting status bundles for {len(session_ids)} tasks: {str(e)}")
+            return [
+                {"task_id": session_id, "status": "UNKNOWN", "error": str(e)}
+                for session_id in session_ids
+            ]
+
+        count = len(session_ids)
+        return [
+            self._build_status_bundle(session_id, values[i], values[count + i])
+            for i, session_id in enumerate(session_ids)
+        ]
+
+    def _build_status_bundle(self, session_id: str, raw: Optional[bytes], raw_result: Optional[bytes]) -> Dict[str, Any]:
+        """根据结果后端元数据和 Worker 结果键的原始值构建任务信息"""
+        # 结果后端中没有记录的任务视为 PENDING，与 AsyncResult 行为一致
+        meta = orjson.loads(raw) if raw else {"status": "PENDING"}
+        if raw_result and meta.get("status") not in READY_STATES:
+            meta = {"status": "SUCCESS", "result": orjson.loads(raw_result)}
+        status = meta.get("status", "PENDING")
+        ready = status in READY_STATES
+        successful = status == "SUCCESS" if ready else None
+        failed = ready and not successful
+
+        return {
+            "task_id": session_id,
+            "status": status,
+            "ready": ready,
+            "successful": successful,
+            "result": meta.get("result") if successful else None,
+            "error": self._format_task_error(meta.get("result")) if failed else None,
+            "traceback": meta.get("traceback") if failed else None
+        }
+
 task_queue = TaskQueue()
\ No newline at end of file
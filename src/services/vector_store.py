@@ -4,6 +4,7 @@
 """
 
 import logging
+import threading
 import time
 from typing import List, Dict, Any, Optional, Tuple
 import chromadb
@@ -433,7 +434,13 @@ class VectorStore:
             self.client.create_collection(
                 name=collection_name,
                 embedding_function=chroma_embedding_function,
-                metadata={"created_by": "GithubBot"}
+                metadata={
+                    "created_by": "GithubBot",
+                    "hnsw:space": settings.CHROMADB_HNSW_SPACE,
+                    "hnsw:M": settings.CHROMADB_HNSW_M,
+                    "hnsw:construction_ef": settings.CHROMADB_HNSW_CONSTRUCTION_EF,
+                    "hnsw:search_ef": settings.CHROMADB_HNSW_SEARCH_EF,
+                }
             )
             logger.info(f"✅ [ChromaDB 调用完成] client.create_collection 执行成功")
 
@@ -537,20 +544,24 @@ class VectorStore:
                     collection_count = collection.count()
                     logger.info(f"📊 [数据库状态] 集合: {collection_name} - 当前总文档数: {collection_count}")
                     
-                    # 获取最近添加的几个文档进行验证
+                    # 获取最近添加的几个文档进行验证（只取元数据，内容长度使用本地批次数据）
+                    verify_count = min(3, len(ids))
                     recent_docs = collection.get(
-                        ids=ids[:min(3, len(ids))],  # 获取刚添加的前3个文档
-                        include=["documents", "metadatas"]
+                        ids=ids[:verify_count],  # 获取刚添加的前3个文档
+                        include=["metadatas"]
                     )
+                    content_lengths = {
+                        doc_id: len(content) if content else 0
+                        for doc_id, content in zip(ids[:verify_count], documents_content)
+                    }
                     
                     logger.info(f"🔍 [验证数据] 集合: {collection_name} - 刚添加的文档验证:")
-                    for idx, (doc_id, doc_content, doc_metadata) in enumerate(zip(
+                    for idx, (doc_id, doc_metadata) in enumerate(zip(
                         recent_docs['ids'], 
-                        recent_docs['documents'], 
                         recent_docs['metadatas']
                     )):
                         file_path = doc_metadata.get('file_path', 'unknown')
-                        content_length = len(doc_content) if doc_content else 0
+                        content_length = content_lengths.get(doc_id, 0)
                         logger.info(f"  📄 文档 {idx+1}: ID={doc_id}, 文件={file_path}, 内容长度={content_length}")
                         
                 except Exception as verify_error:
@@ -564,7 +575,8 @@ class VectorStore:
                 logger.info(f"📈 [最终统计] 集合: {collection_name} - 存储完成后总文档数: {final_count}")
                 
                 # 获取集合中的一些样本数据进行最终验证
-                sample_data = collection.peek(limit=5)
+                # peek 默认会连同向量一起返回，这里只取文档和元数据
+                sample_data = collection.get(limit=5, include=["documents", "metadatas"])
                 logger.info(f"🔍 [样本数据] 集合: {collection_name} - 集合中的样本文档:")
                 for idx, (doc_id, doc_content, doc_metadata) in enumerate(zip(
                     sample_data['ids'], 
@@ -681,12 +693,19 @@ class VectorStore:
             logger.info(f"📝 [集合不存在] 集合 {collection_name} 不存在: {str(e)}")
             return False
 
-    def get_all_documents_from_collection(self, collection_name: str) -> List[Dict[str, Any]]:
+    def get_all_documents_from_collection(
+            self,
+            collection_name: str,
+            page_size: int = 5000
+    ) -> List[Dict[str, Any]]:
         """
         获取集合中的所有文档（用于 BM25 检索）
 
+        按 limit/offset 分页拉取，避免大集合一次性通过单个 HTTP 响应传输全部文档
+
         Args:
             collection_name: 集合名称
+            page_size: 每页拉取的文档数量
 
         Returns:
             List[Dict[str, Any]]: 文档列表
@@ -694,18 +713,28 @@ class VectorStore:
         try:
             collection = self.client.get_collection(collection_name)
 
-            # 获取所有文档
-            results = collection.get(
-                include=["metadatas", "documents"]
-            )
-
             documents = []
-            for i, doc_id in enumerate(results["ids"]):
-                documents.append({
-                    "id": doc_id,
-                    "content": results["documents"][i],
-                    "metadata": results["metadatas"][i]
-                })
+            offset = 0
+            while True:
+                page = collection.get(
+                    limit=page_size,
+                    offset=offset,
+                    include=["metadatas", "documents"]
+                )
+                page_ids = page["ids"]
+                if not page_ids:
+                    break
+
+                for doc_id, content, metadata in zip(page_ids, page["documents"], page["metadatas"]):
+                    documents.append({
+                        "id": doc_id,
+                        "content": content,
+                        "metadata": metadata
+                    })
+
+                if len(page_ids) < page_size:
+                    break
+                offset += len(page_ids)
 
             return documents
 
@@ -739,10 +768,14 @@ class VectorStore:
 
 # 全局向量存储实例（延迟初始化）
 vector_store = None
+_vector_store_lock = threading.Lock()
 
 def get_vector_store() -> VectorStore:
-    """获取向量存储实例（延迟初始化）"""
+    """获取向量存储实例（延迟初始化，并发安全，整个进程共用一个 ChromaDB 客户端）"""
     global vector_store
     if vector_store is None:
-        vector_store = VectorStore()
+        with _vector_store_lock:
+            # 双重检查，避免并发首次调用时重复创建客户端
+            if vector_store is None:
+                vector_store = VectorStore()
     return vector_store
\ No newline at end of file
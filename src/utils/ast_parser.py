@@ -7,6 +7,7 @@ import logging
 import os
 import re
 import json
+from collections import Counter
 from typing import Any, Dict, List, Optional, Set, Callable, NamedTuple
 from langchain_core.documents import Document
 from tree_sitter import Language, Parser, Node
@@ -1050,10 +1051,8 @@ class AstParser:
         element_names = [doc.metadata.get("element_name", "") for doc in docs]
         
         # 确定主要类型
-        type_counts = {}
-        for et in element_types:
-            type_counts[et] = type_counts.get(et, 0) + 1
-        main_type = max(type_counts, key=type_counts.get) if type_counts else "merged"
+        type_counts = Counter(element_types)
+        main_type = type_counts.most_common(1)[0][0] if type_counts else "merged"
         
         # 创建合并的元数据
         merged_metadata = {
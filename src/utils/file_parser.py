@@ -6,9 +6,9 @@
 import os
 import json
 import logging
-import fnmatch
 from typing import List, Dict, Any, Optional, Iterator, Tuple
 import chardet
+import pathspec
 from langchain_text_splitters import (
     RecursiveCharacterTextSplitter,
     Language,
@@ -19,6 +19,29 @@ from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 扩展名小写化结果缓存（仓库中不同扩展名的数量很少）
+_EXTENSION_CACHE: Dict[str, str] = {}
+
+
+def get_file_extension(file_name: str) -> str:
+    """
+    获取小写的文件扩展名，语义与 os.path.splitext(file_name)[1].lower() 一致
+
+    Args:
+        file_name: 文件名（不含目录）
+
+    Returns:
+        str: 扩展名（含点号），无扩展名时返回空字符串
+    """
+    head, dot, tail = file_name.rpartition('.')
+    # 与 splitext 一致：以点开头的隐藏文件（如 .gitignore）没有扩展名
+    if not dot or not head.lstrip('.'):
+        return ''
+    ext = _EXTENSION_CACHE.get(tail)
+    if ext is None:
+        ext = _EXTENSION_CACHE[tail] = '.' + tail.lower()
+    return ext
+
 
 class FileType:
     """文件类型常量"""
@@ -102,8 +125,9 @@ class FileParser:
     
     def __init__(self):
         self.gitignore_patterns = []
-        self.excluded_dirs = set(settings.EXCLUDED_DIRECTORIES)
-        self.allowed_extensions = set(settings.ALLOWED_FILE_EXTENSIONS)
+        self._ignore_spec: Optional[pathspec.PathSpec] = None
+        self.excluded_dirs = settings.excluded_directories_set
+        self.allowed_extensions = settings.allowed_file_extensions_set
     
     def load_gitignore(self, repo_path: str) -> None:
         """
@@ -114,6 +138,7 @@ class FileParser:
         """
         gitignore_path = os.path.join(repo_path, '.gitignore')
         self.gitignore_patterns = []
+        self._ignore_spec = None
         
         if os.path.exists(gitignore_path):
             try:
@@ -123,6 +148,8 @@ class FileParser:
                         # 跳过空行和注释
                         if line and not line.startswith('#'):
                             self.gitignore_patterns.append(line)
+                # 一次性预编译为 gitwildmatch 规则集，避免逐文件逐规则调用 fnmatch
+                self._ignore_spec = pathspec.PathSpec.from_lines('gitwildmatch', self.gitignore_patterns)
                 logger.info(f"加载了 {len(self.gitignore_patterns)} 条 .gitignore 规则")
             except Exception as e:
                 logger.warning(f"读取 .gitignore 文件失败: {str(e)}")
@@ -138,7 +165,7 @@ class FileParser:
         Returns:
             bool: 是否被忽略
         """
-        if not self.gitignore_patterns:
+        if self._ignore_spec is None:
             return False
         
         # 获取相对路径
@@ -149,11 +176,22 @@ class FileParser:
         except ValueError:
             return False
         
-        for pattern in self.gitignore_patterns:
-            if fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(os.path.basename(rel_path), pattern):
-                return True
+        return self._is_ignored_rel_path(rel_path)
+    
+    def _is_ignored_rel_path(self, rel_path: str) -> bool:
+        """
+        使用已加载的 .gitignore 规则检查 Unix 风格的相对路径
         
-        return False
+        Args:
+            rel_path: 相对于仓库根目录的路径（使用 / 分隔）
+            
+        Returns:
+            bool: 是否被忽略
+        """
+        if self._ignore_spec is None:
+            return False
+        
+        return self._ignore_spec.match_file(rel_path)
     
     def should_skip_directory(self, dir_name: str) -> bool:
         """
@@ -182,8 +220,19 @@ class FileParser:
         if self.is_ignored_by_gitignore(file_path, repo_path):
             return False
         
-        file_name = os.path.basename(file_path)
-        file_ext = os.path.splitext(file_name)[1].lower()
+        return self._is_allowed_file_name(os.path.basename(file_path))
+    
+    def _is_allowed_file_name(self, file_name: str) -> bool:
+        """
+        按文件名检查二进制黑名单和扩展名白名单
+        
+        Args:
+            file_name: 文件名
+            
+        Returns:
+            bool: 是否允许处理
+        """
+        file_ext = get_file_extension(file_name)
         
         # 检查是否为二进制文件
         if file_ext in self.BINARY_EXTENSIONS:
@@ -212,7 +261,7 @@ class FileParser:
             Tuple[str, Optional[Language]]: (文件类型, 编程语言)
         """
         file_name = os.path.basename(file_path).lower()
-        file_ext = os.path.splitext(file_name)[1].lower()
+        file_ext = get_file_extension(file_name)
         
         # 检查扩展名映射
         if file_ext in self.FILE_TYPE_MAPPING:
@@ -470,6 +519,43 @@ class FileParser:
         
         return {"type": "unknown"}
     
+    def _iter_file_entries(self, dir_path: str, rel_dir: str) -> Iterator[Tuple[os.DirEntry, str]]:
+        """
+        基于 os.scandir 递归遍历目录，跳过排除的目录
+        
+        先产出当前目录下的文件，再进入子目录，与 os.walk 自顶向下的顺序一致。
+        
+        Args:
+            dir_path: 当前目录的绝对路径
+            rel_dir: 当前目录相对于仓库根目录的路径（使用 / 分隔，根目录为空字符串）
+            
+        Yields:
+            Tuple[os.DirEntry, str]: (文件条目, 使用 / 分隔的相对路径)
+        """
+        sub_dirs = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    if is_dir:
+                        # 与 os.walk 默认行为一致：不跟随指向目录的符号链接
+                        if self.should_skip_directory(entry.name) or entry.is_symlink():
+                            logger.debug(f"跳过目录: {rel_path}")
+                        else:
+                            sub_dirs.append((entry.path, rel_path))
+                    else:
+                        yield entry, rel_path
+        except OSError as e:
+            logger.warning(f"无法读取目录 {dir_path}: {str(e)}")
+            return
+        
+        for sub_dir_path, sub_rel_dir in sub_dirs:
+            yield from self._iter_file_entries(sub_dir_path, sub_rel_dir)
+    
     def scan_repository(self, repo_path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
         """
         扫描仓库中的所有文件
@@ -490,52 +576,40 @@ class FileParser:
         processed_files = 0
         skipped_files = 0
         
-        for root, dirs, files in os.walk(repo_path):
-            # 过滤目录
-            original_dirs = len(dirs)
-            dirs[:] = [d for d in dirs if not self.should_skip_directory(d)]
-            filtered_dirs = len(dirs)
-            
-            if original_dirs > filtered_dirs:
-                logger.debug(f"跳过 {original_dirs - filtered_dirs} 个目录在: {root}")
+        for entry, rel_path in self._iter_file_entries(repo_path, ""):
+            total_files_found += 1
+            file_name = entry.name
+            file_path = entry.path
             
-            total_files_found += len(files)
+            # 检查是否应该处理该文件（相对路径只计算一次，供 .gitignore 匹配和结果复用）
+            if self._is_ignored_rel_path(rel_path) or not self._is_allowed_file_name(file_name):
+                skipped_files += 1
+                logger.debug(f"跳过文件: {rel_path}")
+                continue
             
-            for file_name in files:
-                file_path = os.path.join(root, file_name)
+            # 获取文件信息
+            try:
+                stat = entry.stat()
+                file_type, language = self.get_file_type_and_language(file_path)
                 
-                # 检查是否应该处理该文件
-                if not self.should_process_file(file_path, repo_path):
-                    skipped_files += 1
-                    logger.debug(f"跳过文件: {os.path.relpath(file_path, repo_path)}")
-                    continue
+                file_info = {
+                    "file_path": rel_path.replace('/', os.path.sep),
+                    "full_path": file_path,
+                    "file_type": file_type,
+                    "language": language.value if language and hasattr(language, 'value') else "",
+                    "file_size": stat.st_size,
+                    "file_extension": get_file_extension(file_name)
+                }
                 
-                # 获取文件相对路径
-                rel_path = os.path.relpath(file_path, repo_path)
+                processed_files += 1
+                if processed_files % 50 == 0:  # 每处理50个文件记录一次进度
+                    logger.info(f"文件扫描进度: 已处理 {processed_files} 个文件")
                 
-                # 获取文件信息
-                try:
-                    stat = os.stat(file_path)
-                    file_type, language = self.get_file_type_and_language(file_path)
-                    
-                    file_info = {
-                        "file_path": rel_path,
-                        "full_path": file_path,
-                        "file_type": file_type,
-                        "language": language.value if language and hasattr(language, 'value') else "",
-                        "file_size": stat.st_size,
-                        "file_extension": os.path.splitext(file_name)[1].lower()
-                    }
-                    
-                    processed_files += 1
-                    if processed_files % 50 == 0:  # 每处理50个文件记录一次进度
-                        logger.info(f"文件扫描进度: 已处理 {processed_files} 个文件")
-                    
-                    logger.debug(f"扫描到文件: {rel_path} (类型: {file_type}, 大小: {stat.st_size} bytes)")
-                    yield file_path, file_info
-                    
-                except Exception as e:
-                    logger.error(f"获取文件信息失败 {file_path}: {str(e)}")
-                    continue
+                logger.debug(f"扫描到文件: {rel_path} (类型: {file_type}, 大小: {stat.st_size} bytes)")
+                yield file_path, file_info
+                
+            except Exception as e:
+                logger.error(f"获取文件信息失败 {file_path}: {str(e)}")
+                continue
         
         logger.info(f"文件扫描完成 - 总计发现: {total_files_found} 个文件, 处理: {processed_files} 个, 跳过: {skipped_files} 个")
\ No newline at end of file
@@ -1,6 +1,8 @@
 from celery import Celery
+from celery.signals import worker_process_init
 import os
 from ..core.config import settings
+from ..db.session import dispose_engine
 
 def make_celery_config() -> dict:
     """生成 Celery 配置"""
@@ -18,6 +20,15 @@ def make_celery_config() -> dict:
         "worker_disable_rate_limits": False,
         "task_compression": 'gzip',  # 压缩大任务
         "result_expires": 3600,  # 结果过期时间（1小时）
+        # 连接池：broker 和结果后端都复用连接，并开启 TCP keepalive
+        "broker_pool_limit": settings.CELERY_BROKER_POOL_LIMIT,
+        "broker_connection_retry_on_startup": True,
+        "broker_transport_options": {
+            "socket_keepalive": True,
+            "max_connections": settings.CELERY_BROKER_POOL_LIMIT,
+        },
+        "redis_max_connections": settings.CELERY_REDIS_MAX_CONNECTIONS,
+        "redis_socket_keepalive": True,
         "task_routes": {
             "src.worker.tasks.process_query": {"queue": "query_queue"},
         },
@@ -42,4 +53,10 @@ if settings.DEBUG:
     celery_app.conf.update(
         worker_log_level="DEBUG",
         task_eager_propagates_exceptions=True,
-    )
\ No newline at end of file
+    )
+
+
+@worker_process_init.connect
+def reset_db_engine(**kwargs):
+    """Worker 子进程启动时丢弃从父进程继承的数据库连接池，避免父子进程共用同一个 socket"""
+    dispose_engine(close=False)
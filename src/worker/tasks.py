@@ -3,6 +3,7 @@ from ..schemas.repository import QueryRequest
 from ..services.query_service import query_service
 from ..services.ingestion_service import ingestion_service
 from ..services.embedding_manager import EmbeddingConfig
+from ..services.session_cache import publish_query_result
 import logging
 
 logger = logging.getLogger(__name__)
@@ -93,13 +94,16 @@ def process_query(self, session_id: str, request_data: dict):
         }
         
         logger.info(f"Query task {session_id} completed successfully")
-        return result
         
     except Exception as e:
         logger.error(f"Query task {session_id} failed: {e}")
         # 返回错误结果
-        return {
+        result = {
             "success": False,
             "error": str(e),
             "session_id": session_id
-        }
\ No newline at end of file
+        }
+    
+    # 写入结果供 API 直接读取，并推送给通过 WebSocket 订阅的客户端
+    publish_query_result(session_id, result)
+    return result
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+设置接口 .env 读写测试
+"""
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from src.api.v1.endpoints import settings as settings_endpoint
+from src.api.v1.endpoints.settings import _parse_env_text, update_env_many
+
+
+class TestParseEnvText(unittest.TestCase):
+    """.env 内容解析测试"""
+
+    def test_basic_pairs_and_comments(self):
+        """解析键值对，跳过空行和注释行"""
+        text = "# 注释\n\nA=1\n   # 缩进的注释\nB=2\n"
+        self.assertEqual(_parse_env_text(text), {"A": "1", "B": "2"})
+
+    def test_strips_matching_quotes(self):
+        """两端是同一种引号时去掉引号，引号内的空白保留"""
+        text = "A=\"double\"\nB='single'\nC=\"  padded  \"\nD=\"mismatch'\nE=\"\n"
+        self.assertEqual(_parse_env_text(text), {
+            "A": "double",
+            "B": "single",
+            "C": "  padded  ",
+            "D": "\"mismatch'",
+            "E": "",
+        })
+
+    def test_hash_inside_value_is_kept(self):
+        """值中的 # 不视为注释"""
+        text = "URL=http://host/path#frag\nMSG=\"a # b\"\n"
+        self.assertEqual(_parse_env_text(text), {"URL": "http://host/path#frag", "MSG": "a # b"})
+
+    def test_only_first_equals_separates_key(self):
+        """只按第一个等号分割，值中可以包含等号"""
+        text = "DATABASE_URL=postgresql://u:p@h/db?sslmode=require\nEMPTY=\n"
+        self.assertEqual(_parse_env_text(text), {
+            "DATABASE_URL": "postgresql://u:p@h/db?sslmode=require",
+            "EMPTY": "",
+        })
+
+    def test_trims_whitespace_around_key_and_value(self):
+        """键和值两端的空白（包括 CRLF 换行）不计入"""
+        text = "  A  =  two words  \r\nB=1\t\r\n"
+        self.assertEqual(_parse_env_text(text), {"A": "two words", "B": "1"})
+
+    def test_later_duplicate_wins(self):
+        """重复的键以最后一次出现为准"""
+        self.assertEqual(_parse_env_text("A=1\nA=2\n"), {"A": "2"})
+
+    def test_counts_malformed_lines(self):
+        """既不是注释也不含等号的行被跳过并计数"""
+        text = "A=1\nnot a pair\n# comment\njust_word\n\nB=2\n"
+        with self.assertLogs("src.api.v1.endpoints.settings", level="WARNING") as logs:
+            env_vars = _parse_env_text(text)
+
+        self.assertEqual(env_vars, {"A": "1", "B": "2"})
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("2行格式不正确", logs.output[0])
+
+    def test_no_warning_without_malformed_lines(self):
+        """没有格式错误的行时不输出警告"""
+        with self.assertNoLogs("src.api.v1.endpoints.settings", level="WARNING"):
+            _parse_env_text("# comment\nA=1\n")
+
+
+@unittest.skipUnless(os.name == "posix", "依赖 POSIX 文件权限和符号链接")
+class TestUpdateEnvMany(unittest.TestCase):
+    """.env 批量写入测试"""
+
+    def setUp(self):
+        """测试前准备：在临时目录中创建 .env 并替换模块使用的路径"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.env_file = Path(self.temp_dir.name) / ".env"
+        self.env_file.write_text("A=1\n# comment\nB=2\n", encoding="utf-8")
+        os.chmod(self.env_file, 0o600)
+
+        self.env_patch = mock.patch.object(settings_endpoint, "env_path", self.env_file)
+        self.env_patch.start()
+        self.environ_patch = mock.patch.dict(os.environ)
+        self.environ_patch.start()
+
+    def tearDown(self):
+        """测试后清理"""
+        self.environ_patch.stop()
+        self.env_patch.stop()
+        self.temp_dir.cleanup()
+
+    def test_updates_existing_and_appends_new_keys(self):
+        """已有的键原位替换，新键追加到末尾，返回旧值"""
+        success, _, old_values = update_env_many({"B": "3", "C": "4"})
+
+        self.assertTrue(success)
+        self.assertEqual(old_values, {"B": "2", "C": None})
+        self.assertEqual(self.env_file.read_text(encoding="utf-8"), "A=1\n# comment\nB=3\nC=4\n")
+
+    def test_preserves_file_mode(self):
+        """替换后的文件沿用原文件的权限"""
+        update_env_many({"A": "secret"})
+
+        self.assertEqual(stat.S_IMODE(self.env_file.stat().st_mode), 0o600)
+
+    def test_writes_through_symlink(self):
+        """.env 为符号链接时更新链接指向的文件，链接本身保留"""
+        real_file = Path(self.temp_dir.name) / "real.env"
+        self.env_file.rename(real_file)
+        self.env_file.symlink_to(real_file)
+
+        success, _, _ = update_env_many({"A": "2"})
+
+        self.assertTrue(success)
+        self.assertTrue(self.env_file.is_symlink())
+        self.assertEqual(real_file.read_text(encoding="utf-8"), "A=2\n# comment\nB=2\n")
+        self.assertEqual(stat.S_IMODE(real_file.stat().st_mode), 0o600)
+
+    def test_rejects_invalid_keys(self):
+        """键中包含等号或换行时整批不写入"""
+        for key in ("", "A=B", "A\nB", "A\rB"):
+            with self.subTest(key=key):
+                success, _, old_values = update_env_many({"B": "3", key: "x"})
+
+                self.assertFalse(success)
+                self.assertIsNone(old_values)
+                self.assertEqual(self.env_file.read_text(encoding="utf-8"), "A=1\n# comment\nB=2\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+"""
+数据库批量写入和建表辅助函数测试
+"""
+
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from src.db.session import COPY_MIN_ROWS, _check_session_status_column, _copy_text_value, bulk_copy_file_metadata
+
+
+def decode_copy_field(field: str):
+    """按 PostgreSQL COPY text 格式的规则还原字段"""
+    if field == "\\N":
+        return None
+    escapes = {"\\": "\\", "t": "\t", "n": "\n", "r": "\r"}
+    result = []
+    chars = iter(field)
+    for char in chars:
+        result.append(escapes[next(chars)] if char == "\\" else char)
+    return "".join(result)
+
+
+class TestCopyTextValue(unittest.TestCase):
+    """COPY text 字段编码测试"""
+
+    def test_none_is_null_marker(self):
+        """None 编码为 \\N"""
+        self.assertEqual(_copy_text_value(None), "\\N")
+
+    def test_escapes_special_characters(self):
+        """反斜杠、制表符、换行和回车被转义，编码结果中不再出现分隔符"""
+        value = "C:\\path\tcol\nline\r\nend"
+        encoded = _copy_text_value(value)
+
+        self.assertEqual(encoded, "C:\\\\path\\tcol\\nline\\r\\nend")
+        self.assertNotIn("\t", encoded)
+        self.assertNotIn("\n", encoded)
+        self.assertEqual(decode_copy_field(encoded), value)
+
+    def test_literal_backslash_n_is_not_null(self):
+        """内容恰好是 \\N 的字符串不会被当作 NULL"""
+        encoded = _copy_text_value("\\N")
+
+        self.assertEqual(encoded, "\\\\N")
+        self.assertEqual(decode_copy_field(encoded), "\\N")
+
+    def test_json_values(self):
+        """dict 和 list 编码为 JSON，字符串中的换行和反斜杠经两层转义后仍能还原"""
+        value = {"symbols": ["main", "类名"], "doc": "line1\nline2", "path": "a\\b"}
+        encoded = _copy_text_value(value)
+
+        self.assertIn("类名", encoded)
+        self.assertEqual(json.loads(decode_copy_field(encoded)), value)
+        self.assertEqual(json.loads(decode_copy_field(_copy_text_value(["x", 1]))), ["x", 1])
+
+    def test_bools(self):
+        """布尔值编码为 PostgreSQL 的 t / f，而不是按整数处理"""
+        self.assertEqual(_copy_text_value(True), "t")
+        self.assertEqual(_copy_text_value(False), "f")
+
+    def test_numbers(self):
+        """数字按 str() 输出"""
+        self.assertEqual(_copy_text_value(42), "42")
+        self.assertEqual(_copy_text_value(0), "0")
+        self.assertEqual(_copy_text_value(1.5), "1.5")
+
+
+class TestBulkCopyFileMetadata(unittest.TestCase):
+    """bulk_copy_file_metadata 路径选择测试"""
+
+    def make_db(self, driver: str) -> mock.MagicMock:
+        """构造指定驱动的会话替身"""
+        db = mock.MagicMock()
+        db.get_bind.return_value.dialect.driver = driver
+        return db
+
+    def make_rows(self, count: int):
+        return [
+            {"session_id": "s1", "file_path": f"src/{i}.py", "is_processed": True, "key_symbols": None}
+            for i in range(count)
+        ]
+
+    def test_small_batch_uses_executemany(self):
+        """行数不足 COPY_MIN_ROWS 时回退到 executemany INSERT"""
+        db = self.make_db("psycopg2")
+        rows = self.make_rows(COPY_MIN_ROWS - 1)
+
+        bulk_copy_file_metadata(db, rows)
+
+        db.execute.assert_called_once()
+        self.assertIs(db.execute.call_args.args[1], rows)
+        db.connection.assert_not_called()
+
+    def test_other_driver_uses_executemany(self):
+        """非 psycopg2 驱动不使用 COPY"""
+        db = self.make_db("pysqlite")
+
+        bulk_copy_file_metadata(db, self.make_rows(COPY_MIN_ROWS))
+
+        db.execute.assert_called_once()
+        db.connection.assert_not_called()
+
+    def test_large_batch_uses_copy(self):
+        """psycopg2 下足够多的行通过一次 COPY 写入，按列顺序输出制表符分隔的行"""
+        db = self.make_db("psycopg2")
+        cursor = db.connection.return_value.connection.cursor.return_value
+        copied = {}
+        cursor.copy_expert.side_effect = lambda sql, buffer: copied.update(sql=sql, data=buffer.read())
+
+        bulk_copy_file_metadata(db, self.make_rows(COPY_MIN_ROWS))
+
+        db.execute.assert_not_called()
+        cursor.close.assert_called_once()
+        self.assertEqual(
+            copied["sql"],
+            "COPY file_metadata (session_id, file_path, is_processed, key_symbols) FROM STDIN"
+        )
+        lines = copied["data"].splitlines()
+        self.assertEqual(len(lines), COPY_MIN_ROWS)
+        self.assertEqual(lines[0], "s1\tsrc/0.py\tt\t\\N")
+
+    def test_empty_rows_do_nothing(self):
+        """没有数据时不访问数据库"""
+        db = self.make_db("psycopg2")
+
+        bulk_copy_file_metadata(db, [])
+
+        db.execute.assert_not_called()
+        db.connection.assert_not_called()
+
+
+
+class TestCheckSessionStatusColumn(unittest.TestCase):
+    """启动时的 status 列类型检查测试"""
+
+    def make_engine(self, dialect: str, data_type) -> mock.MagicMock:
+        """构造指定方言、status 列类型查询结果的引擎替身"""
+        engine = mock.MagicMock()
+        engine.dialect.name = dialect
+        conn = engine.connect.return_value.__enter__.return_value
+        conn.execute.return_value.scalar.return_value = data_type
+        return engine
+
+    def test_native_enum_fails_fast(self):
+        """status 仍是原生 ENUM 时报错并提示迁移脚本"""
+        engine = self.make_engine("postgresql", "USER-DEFINED")
+
+        with self.assertRaises(RuntimeError) as ctx:
+            _check_session_status_column(engine)
+
+        self.assertIn("convert_session_status_to_varchar.py", str(ctx.exception))
+
+    def test_varchar_passes(self):
+        """已迁移为 VARCHAR 或列不存在时不报错"""
+        for data_type in ("character varying", None):
+            with self.subTest(data_type=data_type):
+                _check_session_status_column(self.make_engine("postgresql", data_type))
+
+    def test_other_dialect_is_skipped(self):
+        """非 PostgreSQL 数据库不查询 information_schema"""
+        engine = self.make_engine("sqlite", "USER-DEFINED")
+
+        _check_session_status_column(engine)
+
+        engine.connect.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+"""
+Embedding 向量缓存测试
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from array import array
+from typing import List
+from unittest import mock
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from langchain_core.embeddings import Embeddings
+
+from src.services import embedding_cache
+from src.services.embedding_cache import EmbeddingCache, MemoryEmbeddingCache
+from src.services.embedding_manager import BatchEmbeddingProcessor, EmbeddingConfig, embed_query_cached
+
+
+class CountingEmbeddings(Embeddings):
+    """记录每次调用收到的文本，向量为 [文本长度, 调用序号]"""
+
+    def __init__(self):
+        self.calls: List[List[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return [[float(len(text)), float(len(self.calls))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    """SQLite 持久化缓存测试"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = EmbeddingCache(os.path.join(self.temp_dir.name, "cache", "embeddings.db"))
+
+    def tearDown(self):
+        """测试后清理"""
+        self.cache._conn.close()
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        """写入后能按键读回（以 float32 存储）"""
+        key_a = EmbeddingCache.make_key("openai", "text-embedding-3-small", "a")
+        key_b = EmbeddingCache.make_key("openai", "text-embedding-3-small", "b")
+        self.cache.put_many([(key_a, [0.5, -1.25]), (key_b, [3.0, 4.0])])
+
+        found = self.cache.get_many([key_a, key_b, b"missing"])
+
+        self.assertEqual(found, {key_a: [0.5, -1.25], key_b: [3.0, 4.0]})
+
+    def test_put_overwrites_existing_key(self):
+        """相同的键再次写入时覆盖旧向量"""
+        key = EmbeddingCache.make_key("openai", "m", "a")
+        self.cache.put_many([(key, [1.0])])
+        self.cache.put_many([(key, [2.0])])
+
+        self.assertEqual(self.cache.get_many([key]), {key: [2.0]})
+
+    def test_make_key_separates_fields(self):
+        """提供商、模型和文本任一不同时键都不同"""
+        keys = {
+            EmbeddingCache.make_key("openai", "m", "text"),
+            EmbeddingCache.make_key("jina", "m", "text"),
+            EmbeddingCache.make_key("openai", "m2", "text"),
+            EmbeddingCache.make_key("openai", "m", "text2"),
+        }
+        self.assertEqual(len(keys), 4)
+
+    def test_get_many_splits_in_queries(self):
+        """键数超过单条语句的参数上限时分批查询，结果完整"""
+        items = [(EmbeddingCache.make_key("openai", "m", str(i)), [float(i)]) for i in range(10)]
+        self.cache.put_many(items)
+
+        with mock.patch.object(embedding_cache, "_SQLITE_MAX_PARAMS", 3):
+            found = self.cache.get_many([key for key, _ in items])
+
+        self.assertEqual(found, dict(items))
+
+    def test_evicts_least_recently_accessed_over_limit(self):
+        """超出上限时淘汰到上限的 90%，最近读取过的条目保留"""
+        path = os.path.join(self.temp_dir.name, "capped.db")
+        cache = EmbeddingCache(path, max_entries=10)
+        self.addCleanup(cache._conn.close)
+        keys = [EmbeddingCache.make_key("openai", "m", str(i)) for i in range(11)]
+
+        for i, key in enumerate(keys[:10]):
+            with mock.patch.object(embedding_cache.time, "time", return_value=1000.0 + i):
+                cache.put_many([(key, [float(i)])])
+        # 超过回写间隔后读取第一个条目，使其成为最近访问的条目
+        with mock.patch.object(embedding_cache.time, "time", return_value=1000.0 + 2 * 3600):
+            cache.get_many([keys[0]])
+            cache.put_many([(keys[10], [10.0])])
+
+        remaining = cache.get_many(keys)
+        self.assertEqual(len(remaining), 9)
+        self.assertIn(keys[0], remaining)
+        self.assertIn(keys[10], remaining)
+        for key in keys[1:3]:
+            self.assertNotIn(key, remaining)
+
+    def test_zero_max_entries_keeps_everything(self):
+        """上限为 0 时不淘汰"""
+        items = [(EmbeddingCache.make_key("openai", "m", str(i)), [float(i)]) for i in range(20)]
+        self.cache.put_many(items)
+
+        self.assertEqual(len(self.cache.get_many([key for key, _ in items])), 20)
+
+    def test_upgrades_legacy_schema(self):
+        """早期没有 accessed_at 列的缓存文件打开后补上该列，已有向量仍可读取"""
+        path = os.path.join(self.temp_dir.name, "legacy.db")
+        key = EmbeddingCache.make_key("openai", "m", "a")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE embeddings (key BLOB PRIMARY KEY, vec BLOB NOT NULL) WITHOUT ROWID")
+        conn.execute("INSERT INTO embeddings (key, vec) VALUES (?, ?)", (key, array("f", [1.5]).tobytes()))
+        conn.commit()
+        conn.close()
+
+        cache = EmbeddingCache(path, max_entries=10)
+        self.addCleanup(cache._conn.close)
+
+        self.assertEqual(cache.get_many([key]), {key: [1.5]})
+        cache.put_many([(EmbeddingCache.make_key("openai", "m", "b"), [2.0])])
+
+
+class TestMemoryEmbeddingCache(unittest.TestCase):
+    """进程内 LRU 缓存测试"""
+
+    def test_evicts_least_recently_used(self):
+        """超出容量时淘汰最久未使用的条目"""
+        cache = MemoryEmbeddingCache(maxsize=2)
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        # 访问 a 后，b 成为最久未使用的条目
+        self.assertEqual(cache.get("a"), [1.0])
+        cache.put("c", [3.0])
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), [1.0])
+        self.assertEqual(cache.get("c"), [3.0])
+        self.assertEqual(cache.stats(), {"hits": 3, "misses": 1, "size": 2, "maxsize": 2})
+
+    def test_zero_size_disables_cache(self):
+        """容量为 0 时不保存任何条目"""
+        cache = MemoryEmbeddingCache(maxsize=0)
+        cache.put("a", [1.0])
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+
+class TestBatchEmbeddingProcessorCache(unittest.IsolatedAsyncioTestCase):
+    """批量向量化的去重和缓存测试"""
+
+    def make_processor(self, model: Embeddings, **config_kwargs) -> BatchEmbeddingProcessor:
+        """创建不使用持久化缓存、使用独立内存缓存的处理器"""
+        config = EmbeddingConfig(provider="openai", model_name="m", **config_kwargs)
+        # 在构造前替换，避免 __init__ 在工作目录下创建默认的 SQLite 缓存文件
+        with mock.patch("src.services.embedding_manager.get_embedding_cache", return_value=None):
+            processor = BatchEmbeddingProcessor(model, config)
+        processor.memory_cache = MemoryEmbeddingCache(maxsize=16)
+        return processor
+
+    async def test_dedup_scatters_back_to_original_positions(self):
+        """重复文本只向量化一次，结果按原位置回填"""
+        model = CountingEmbeddings()
+        processor = self.make_processor(model, batch_size=10)
+
+        embeddings = await processor.embed_documents_with_retry(["a", "bb", "a", "ccc", "bb"])
+
+        self.assertEqual(model.calls, [["a", "bb", "ccc"]])
+        self.assertEqual([vec[0] for vec in embeddings], [1.0, 2.0, 1.0, 3.0, 2.0])
+        self.assertEqual(embeddings[0], embeddings[2])
+        self.assertEqual(embeddings[1], embeddings[4])
+
+    async def test_memory_cache_hit_skips_api(self):
+        """已缓存的文本不再调用 Embedding API"""
+        model = CountingEmbeddings()
+        processor = self.make_processor(model, batch_size=10)
+
+        await processor.embed_documents_with_retry(["a", "bb"])
+        embeddings = await processor.embed_documents_with_retry(["bb", "ccc", "a"])
+
+        self.assertEqual(model.calls, [["a", "bb"], ["ccc"]])
+        self.assertEqual([vec[0] for vec in embeddings], [2.0, 3.0, 1.0])
+
+    def test_model_id_includes_endpoint_and_deployment(self):
+        """同名模型在不同端点或部署上使用不同的缓存键"""
+        model = CountingEmbeddings()
+        default = self.make_processor(model)
+        other_base = self.make_processor(model, api_base="https://example.com/v1")
+        other_deployment = self.make_processor(model, deployment_name="prod")
+
+        model_ids = {default._model_id(), other_base._model_id(), other_deployment._model_id()}
+        cache_keys = {default._cache_key("a"), other_base._cache_key("a"), other_deployment._cache_key("a")}
+
+        self.assertEqual(len(model_ids), 3)
+        self.assertEqual(len(cache_keys), 3)
+
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    """问题向量缓存测试"""
+
+    def test_repeated_question_skips_api(self):
+        """同一模型下重复的问题只向量化一次，换模型后重新向量化"""
+        model = CountingEmbeddings()
+        config = EmbeddingConfig(provider="openai", model_name="m")
+        other_config = EmbeddingConfig(provider="openai", model_name="m2")
+
+        with mock.patch("src.services.embedding_manager.query_embedding_cache", MemoryEmbeddingCache(maxsize=4)):
+            first = embed_query_cached(model, config, "what does main.py do?")
+            second = embed_query_cached(model, config, "what does main.py do?")
+            embed_query_cached(model, other_config, "what does main.py do?")
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(model.calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()